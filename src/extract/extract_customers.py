@@ -3,29 +3,31 @@ Extract customers data from CSV
 Includes geographic validation and deduplication checks
 """
 
-import pandas as pd
+import numpy as np
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from src.utils.logger import setup_logger
-import yaml
+from src.utils.csv_reader import read_csv
+from src.utils.column_stats import top_k, count_distinct, count_duplicates
+from src.extract.base_extractor import BaseExtractor
 
 logger = setup_logger('extract_customers')
 
 
-class CustomersExtractor:
+class CustomersExtractor(BaseExtractor):
     """Extract and validate customers data"""
     
+    source_name = 'customers'
+    
     def __init__(self, config_path='config/file_paths.yaml'):
         """Initialize with file paths from config"""
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
-        self.file_path = config['data_paths']['customers']
+        super().__init__(config_path)
         logger.info(f"CustomersExtractor initialized with path: {self.file_path}")
     
-    def extract(self):
+    def _extract_raw(self):
         """
         Extract customers data from CSV
         
@@ -35,16 +37,13 @@ class CustomersExtractor:
         try:
             logger.info("Starting customers extraction...")
             
-            # Read CSV
-            df = pd.read_csv(self.file_path)
+            # Read CSV (PyArrow multi-threaded parser)
+            df = read_csv(self.file_path, dtypes=self.dtypes)
             logger.info(f"✓ Loaded {len(df):,} rows from {self.file_path}")
             
-            # Basic info logging
-            logger.info(f"  - Unique customer_ids: {df['customer_id'].nunique():,}")
-            if 'customer_unique_id' in df.columns:
-                logger.info(f"  - Unique customer_unique_ids: {df['customer_unique_id'].nunique():,}")
+            # Basic info logging (id counts are logged by _validate_data)
             if 'customer_state' in df.columns:
-                logger.info(f"  - Unique states: {df['customer_state'].nunique()}")
+                logger.info(f"  - Unique states: {count_distinct(df['customer_state'])}")
             if 'customer_city' in df.columns:
                 logger.info(f"  - Unique cities: {df['customer_city'].nunique():,}")
             
@@ -60,9 +59,12 @@ class CustomersExtractor:
     
     def _validate_data(self, df):
         """Validate customers data quality"""
+        n_rows = len(df)
         
         # Check for duplicate customer_id (should be unique per order)
-        duplicate_customer_ids = df['customer_id'].duplicated().sum()
+        # One distinct-count pass serves both the log line and the duplicate check
+        duplicate_customer_ids, unique_customer_ids = count_duplicates(df['customer_id'])
+        logger.info(f"  - Unique customer_ids: {unique_customer_ids:,}")
         if duplicate_customer_ids > 0:
             logger.warning(f"⚠ Found {duplicate_customer_ids} duplicate customer_ids (this is OK if same person ordered multiple times)")
         else:
@@ -70,18 +72,16 @@ class CustomersExtractor:
         
         # Check if customer_unique_id exists and has duplicates (expected)
         if 'customer_unique_id' in df.columns:
-            unique_customers = df['customer_unique_id'].nunique()
-            total_records = len(df)
-            repeat_customers = total_records - unique_customers
-            logger.info(f"  - Repeat customer records: {repeat_customers:,} ({repeat_customers/total_records*100:.1f}%)")
+            unique_customers = count_distinct(df['customer_unique_id'])
+            logger.info(f"  - Unique customer_unique_ids: {unique_customers:,}")
+            repeat_customers = n_rows - unique_customers
+            logger.info(f"  - Repeat customer records: {repeat_customers:,} ({repeat_customers/n_rows*100:.1f}%)")
         
-        # Check for missing critical fields
-        missing_checks = {
-            'customer_id': df['customer_id'].isnull().sum(),
-            'customer_unique_id': df['customer_unique_id'].isnull().sum() if 'customer_unique_id' in df.columns else 0,
-            'customer_state': df['customer_state'].isnull().sum() if 'customer_state' in df.columns else 0,
-            'customer_city': df['customer_city'].isnull().sum() if 'customer_city' in df.columns else 0
-        }
+        # Check for missing critical fields (one DataFrame-level reduction,
+        # absent optional columns count as 0 missing)
+        check_cols = ['customer_id', 'customer_unique_id', 'customer_state', 'customer_city']
+        present_cols = [col for col in check_cols if col in df.columns]
+        missing_checks = df[present_cols].isna().sum().reindex(check_cols, fill_value=0)
         
         critical_missing = False
         for field, missing_count in missing_checks.items():
@@ -90,22 +90,26 @@ class CustomersExtractor:
                     logger.error(f"✗ Missing critical field {field}: {missing_count} nulls")
                     critical_missing = True
                 else:
-                    logger.warning(f"⚠ Missing {field}: {missing_count} nulls ({missing_count/len(df)*100:.2f}%)")
+                    logger.warning(f"⚠ Missing {field}: {missing_count} nulls ({missing_count/n_rows*100:.2f}%)")
         
         if critical_missing:
             raise ValueError("Critical customer fields cannot be null")
         
         # Validate state codes (Brazilian states are 2 characters)
         if 'customer_state' in df.columns:
-            invalid_states = df[df['customer_state'].str.len() != 2]
-            if len(invalid_states) > 0:
-                logger.warning(f"⚠ Found {len(invalid_states)} records with invalid state codes")
+            # Check the ~27 distinct codes once, then look rows up by category code
+            # (code -1 = null picks the trailing True, nulls count as invalid)
+            states = df['customer_state'].astype('category')
+            invalid_lookup = np.append(states.cat.categories.str.len() != 2, True)
+            invalid_states = np.count_nonzero(invalid_lookup[states.cat.codes.to_numpy()])
+            if invalid_states > 0:
+                logger.warning(f"⚠ Found {invalid_states} records with invalid state codes")
             else:
                 logger.info("✓ All state codes are valid (2 characters)")
         
         # Log top states
         if 'customer_state' in df.columns:
-            top_states = df['customer_state'].value_counts().head(5)
+            top_states = top_k(df['customer_state'], 5)
             logger.info(f"  - Top 5 states: {', '.join([f'{state}({count:,})' for state, count in top_states.items()])}")
         
         logger.info("✓ Customer data quality validation passed")
@@ -3,37 +3,42 @@ Extract order items data from CSV
 Includes revenue calculations
 """
 
-import pandas as pd
+import numpy as np
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from src.utils.logger import setup_logger
-import yaml
+from src.utils.csv_reader import read_csv
+from src.extract.base_extractor import BaseExtractor
 
 logger = setup_logger('extract_order_items')
 
 
-class OrderItemsExtractor:
+class OrderItemsExtractor(BaseExtractor):
     """Extract and validate order items data"""
     
+    source_name = 'order_items'
+    
+    DERIVED = {
+        'item_total': lambda df: df['price'] + df['freight_value']
+    }
+    
     def __init__(self, config_path='config/file_paths.yaml'):
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
-        self.file_path = config['data_paths']['order_items']
+        super().__init__(config_path)
     
-    def extract(self):
+    def _extract_raw(self):
         """Extract order items with calculated metrics"""
         try:
             logger.info("Starting order items extraction...")
             
-            # Read CSV
-            df = pd.read_csv(self.file_path)
+            # Read CSV (PyArrow multi-threaded parser)
+            df = read_csv(self.file_path, dtypes=self.dtypes)
             logger.info(f"✓ Loaded {len(df):,} rows")
             
-            # Calculate item total
-            df['item_total'] = df['price'] + df['freight_value']
+            # Calculate item total (see DERIVED)
+            df = self._derive_columns(df)
             logger.info("✓ Calculated item_total column")
             
             # Validate
@@ -48,13 +53,16 @@ class OrderItemsExtractor:
     
     def _validate_data(self, df):
         """Validate order items data"""
+        # Work on the raw ndarray: no pandas temporaries per check
+        price = df['price'].to_numpy()
+        
         # Check for negative prices
-        negative_prices = (df['price'] < 0).sum()
+        negative_prices = np.count_nonzero(price < 0)
         if negative_prices > 0:
             logger.warning(f"⚠ Found {negative_prices} negative prices")
         
         # Check for zero prices
-        zero_prices = (df['price'] == 0).sum()
+        zero_prices = np.count_nonzero(price == 0)
         if zero_prices > 0:
             logger.warning(f"⚠ Found {zero_prices} zero-price items")
         
@@ -4,28 +4,31 @@ Includes payment method validation and aggregation checks
 """
 
 import pandas as pd
+import numpy as np
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from src.utils.logger import setup_logger
-import yaml
+from src.utils.csv_reader import read_csv
+from src.utils.column_stats import top_k, count_distinct, min_max_mean
+from src.extract.base_extractor import BaseExtractor
 
 logger = setup_logger('extract_payments')
 
 
-class PaymentsExtractor:
+class PaymentsExtractor(BaseExtractor):
     """Extract and validate payments data"""
     
+    source_name = 'payments'
+    
     def __init__(self, config_path='config/file_paths.yaml'):
         """Initialize with file paths from config"""
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
-        self.file_path = config['data_paths']['payments']
+        super().__init__(config_path)
         logger.info(f"PaymentsExtractor initialized with path: {self.file_path}")
     
-    def extract(self):
+    def _extract_raw(self):
         """
         Extract payments data from CSV
         
@@ -35,22 +38,24 @@ class PaymentsExtractor:
         try:
             logger.info("Starting payments extraction...")
             
-            # Read CSV
-            df = pd.read_csv(self.file_path)
+            # Read CSV (PyArrow multi-threaded parser)
+            df = read_csv(self.file_path, dtypes=self.dtypes)
             logger.info(f"✓ Loaded {len(df):,} rows from {self.file_path}")
             
             # Basic info logging
             if 'order_id' in df.columns:
-                unique_orders = df['order_id'].nunique()
+                # One hash pass: factorize order_ids, then count rows per code
+                codes, _ = pd.factorize(df['order_id'], sort=False)
+                payments_per_order = np.bincount(codes[codes >= 0])
+                unique_orders = payments_per_order.size
                 logger.info(f"  - Orders with payments: {unique_orders:,}")
                 
                 # Check for multiple payments per order
-                payments_per_order = df.groupby('order_id').size()
-                multi_payment_orders = (payments_per_order > 1).sum()
+                multi_payment_orders = int(np.count_nonzero(payments_per_order > 1))
                 logger.info(f"  - Orders with multiple payments: {multi_payment_orders:,} ({multi_payment_orders/unique_orders*100:.1f}%)")
             
             if 'payment_type' in df.columns:
-                logger.info(f"  - Unique payment types: {df['payment_type'].nunique()}")
+                logger.info(f"  - Unique payment types: {count_distinct(df['payment_type'])}")
                 logger.info(f"  - Payment types: {', '.join(df['payment_type'].unique())}")
             
             if 'payment_value' in df.columns:
@@ -70,8 +75,12 @@ class PaymentsExtractor:
     def _validate_data(self, df):
         """Validate payments data quality"""
         
+        # Null counts for every column in one DataFrame-level reduction
+        n_rows = len(df)
+        na_counts = df.isna().sum()
+        
         # Check for missing critical fields
-        missing_order_id = df['order_id'].isnull().sum()
+        missing_order_id = na_counts['order_id']
         if missing_order_id > 0:
             logger.error(f"✗ Missing order_id: {missing_order_id} nulls")
             raise ValueError("order_id cannot be null in payments")
@@ -80,41 +89,46 @@ class PaymentsExtractor:
         
         # Check payment type
         if 'payment_type' in df.columns:
-            missing_payment_type = df['payment_type'].isnull().sum()
+            missing_payment_type = na_counts['payment_type']
             if missing_payment_type > 0:
                 logger.warning(f"⚠ Missing payment_type: {missing_payment_type} nulls")
             
             # Log payment type distribution
-            payment_dist = df['payment_type'].value_counts()
+            payment_dist = top_k(df['payment_type'], None)
             logger.info("  - Payment type distribution:")
             for ptype, count in payment_dist.items():
-                percentage = (count / len(df)) * 100
+                percentage = (count / n_rows) * 100
                 logger.info(f"    → {ptype}: {count:,} ({percentage:.1f}%)")
         
         # Check payment values
         if 'payment_value' in df.columns:
-            negative_payments = (df['payment_value'] < 0).sum()
-            zero_payments = (df['payment_value'] == 0).sum()
-            missing_payments = df['payment_value'].isnull().sum()
+            # Negative and zero counts from one pass over the signs
+            signs, sign_counts = np.unique(np.sign(df['payment_value'].to_numpy()), return_counts=True)
+            sign_stats = dict(zip(signs.tolist(), sign_counts.tolist()))
+            negative_payments = sign_stats.get(-1, 0)
+            zero_payments = sign_stats.get(0, 0)
+            missing_payments = na_counts['payment_value']
             
             if negative_payments > 0:
                 logger.error(f"✗ Negative payment values: {negative_payments}")
                 # Don't raise - might be refunds
             
             if zero_payments > 0:
-                logger.warning(f"⚠ Zero payment values: {zero_payments} ({zero_payments/len(df)*100:.2f}%)")
+                logger.warning(f"⚠ Zero payment values: {zero_payments} ({zero_payments/n_rows*100:.2f}%)")
             
             if missing_payments > 0:
                 logger.warning(f"⚠ Missing payment values: {missing_payments}")
         
         # Check installments
         if 'payment_installments' in df.columns:
-            logger.info(f"  - Installments stats: min={df['payment_installments'].min():.0f}, "
-                       f"max={df['payment_installments'].max():.0f}, "
-                       f"avg={df['payment_installments'].mean():.1f}")
+            installments = df['payment_installments'].to_numpy()
+            min_installments, max_installments, avg_installments = min_max_mean(installments)
+            logger.info(f"  - Installments stats: min={min_installments:.0f}, "
+                       f"max={max_installments:.0f}, "
+                       f"avg={avg_installments:.1f}")
             
             # Check for invalid installments
-            invalid_installments = (df['payment_installments'] < 1).sum()
+            invalid_installments = np.count_nonzero(installments < 1)
             if invalid_installments > 0:
                 logger.warning(f"⚠ Invalid installments (< 1): {invalid_installments}")
         
@@ -3,29 +3,44 @@ Extract products data from CSV
 Includes product dimension calculations and category validation
 """
 
-import pandas as pd
+import numpy as np
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from src.utils.logger import setup_logger
-import yaml
+from src.utils.csv_reader import read_csv
+from src.utils.column_stats import top_k, count_distinct, count_duplicates, min_max_mean
+from src.extract.base_extractor import BaseExtractor
 
 logger = setup_logger('extract_products')
 
 
-class ProductsExtractor:
+def _product_volume(df):
+    """Product volume (length × width × height), rounded to 2 decimals"""
+    # One output buffer, multiplied and rounded in place (no temporaries)
+    volume = np.multiply(df['product_length_cm'].to_numpy(), df['product_height_cm'].to_numpy())
+    np.multiply(volume, df['product_width_cm'].to_numpy(), out=volume)
+    return np.round(volume, 2, out=volume)
+
+
+class ProductsExtractor(BaseExtractor):
     """Extract and validate products data"""
     
+    source_name = 'products'
+    
+    DERIVED = {
+        'product_volume_cm3': _product_volume,
+        'has_photos': lambda df: df['product_photos_qty'] > 0
+    }
+    
     def __init__(self, config_path='config/file_paths.yaml'):
         """Initialize with file paths from config"""
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
-        self.file_path = config['data_paths']['products']
+        super().__init__(config_path)
         logger.info(f"ProductsExtractor initialized with path: {self.file_path}")
     
-    def extract(self):
+    def _extract_raw(self):
         """
         Extract products data from CSV with calculated fields
         
@@ -35,29 +50,17 @@ class ProductsExtractor:
         try:
             logger.info("Starting products extraction...")
             
-            # Read CSV
-            df = pd.read_csv(self.file_path)
+            # Read CSV (PyArrow multi-threaded parser)
+            df = read_csv(self.file_path, dtypes=self.dtypes)
             logger.info(f"✓ Loaded {len(df):,} rows from {self.file_path}")
             
-            # Calculate product volume (length × width × height)
-            dimension_cols = ['product_length_cm', 'product_height_cm', 'product_width_cm']
-            if all(col in df.columns for col in dimension_cols):
-                df['product_volume_cm3'] = (
-                    df['product_length_cm'] * 
-                    df['product_height_cm'] * 
-                    df['product_width_cm']
-                ).round(2)
-                logger.info("✓ Calculated product_volume_cm3 column")
-            
-            # Create has_photos flag
-            if 'product_photos_qty' in df.columns:
-                df['has_photos'] = df['product_photos_qty'] > 0
-                logger.info("✓ Created has_photos flag column")
+            # Calculate product volume and has_photos flag (see DERIVED)
+            df = self._derive_columns(df)
+            logger.info(f"✓ Calculated derived columns: {', '.join(self.DERIVED)}")
             
-            # Basic info logging
-            logger.info(f"  - Unique products: {df['product_id'].nunique():,}")
+            # Basic info logging (product count is logged by _validate_data)
             if 'product_category_name' in df.columns:
-                logger.info(f"  - Unique categories: {df['product_category_name'].nunique()}")
+                logger.info(f"  - Unique categories: {count_distinct(df['product_category_name'])}")
             
             # Validate data quality
             self._validate_data(df)
@@ -71,9 +74,12 @@ class ProductsExtractor:
     
     def _validate_data(self, df):
         """Validate products data quality"""
+        n_rows = len(df)
+        na_counts = df.isna().sum()
         
         # Check for duplicate product_id (should be unique)
-        duplicate_products = df['product_id'].duplicated().sum()
+        duplicate_products, unique_products = count_duplicates(df['product_id'])
+        logger.info(f"  - Unique products: {unique_products:,}")
         if duplicate_products > 0:
             logger.error(f"✗ Found {duplicate_products} duplicate product_ids - products should be unique!")
             # Don't raise error, but flag for investigation
@@ -81,49 +87,53 @@ class ProductsExtractor:
             logger.info("✓ No duplicate product_ids")
         
         # Check for missing product_id (critical)
-        missing_product_id = df['product_id'].isnull().sum()
+        missing_product_id = na_counts['product_id']
         if missing_product_id > 0:
             logger.error(f"✗ Missing product_id: {missing_product_id} nulls")
             raise ValueError("product_id cannot be null")
         
         # Check for missing category names
         if 'product_category_name' in df.columns:
-            missing_categories = df['product_category_name'].isnull().sum()
+            missing_categories = na_counts['product_category_name']
             if missing_categories > 0:
-                logger.warning(f"⚠ Missing product_category_name: {missing_categories} nulls ({missing_categories/len(df)*100:.2f}%)")
+                logger.warning(f"⚠ Missing product_category_name: {missing_categories} nulls ({missing_categories/n_rows*100:.2f}%)")
                 logger.info("  → These will be labeled as 'Uncategorized' in Transform phase")
             else:
                 logger.info("✓ All products have categories")
         
         # Check for invalid dimensions (negative or zero)
-        dimension_cols = ['product_weight_g', 'product_length_cm', 'product_height_cm', 'product_width_cm']
-        for col in dimension_cols:
-            if col in df.columns:
-                invalid_dims = ((df[col] <= 0) | (df[col].isnull())).sum()
-                if invalid_dims > 0:
-                    logger.warning(f"⚠ Invalid/missing {col}: {invalid_dims} records ({invalid_dims/len(df)*100:.2f}%)")
+        dimension_cols = [col for col in ['product_weight_g', 'product_length_cm', 'product_height_cm', 'product_width_cm']
+                          if col in df.columns]
+        # All dimension columns in one block reduction; NaN > 0 is False,
+        # so one comparison catches both <= 0 and missing
+        invalid_counts = np.count_nonzero(~(df[dimension_cols].to_numpy() > 0), axis=0)
+        for col, invalid_dims in zip(dimension_cols, invalid_counts):
+            if invalid_dims > 0:
+                logger.warning(f"⚠ Invalid/missing {col}: {invalid_dims} records ({invalid_dims/n_rows*100:.2f}%)")
         
         # Log product dimension statistics
         if 'product_weight_g' in df.columns:
-            logger.info(f"  - Weight stats: min={df['product_weight_g'].min():.0f}g, "
-                       f"max={df['product_weight_g'].max():.0f}g, "
-                       f"avg={df['product_weight_g'].mean():.0f}g")
+            min_weight, max_weight, avg_weight = min_max_mean(df['product_weight_g'].to_numpy())
+            logger.info(f"  - Weight stats: min={min_weight:.0f}g, "
+                       f"max={max_weight:.0f}g, "
+                       f"avg={avg_weight:.0f}g")
         
         if 'product_volume_cm3' in df.columns:
-            valid_volumes = df[df['product_volume_cm3'] > 0]
-            logger.info(f"  - Volume stats: min={valid_volumes['product_volume_cm3'].min():.0f}cm³, "
-                       f"max={valid_volumes['product_volume_cm3'].max():.0f}cm³, "
-                       f"avg={valid_volumes['product_volume_cm3'].mean():.0f}cm³")
+            volumes = df['product_volume_cm3'].to_numpy()
+            min_volume, max_volume, avg_volume = min_max_mean(volumes[volumes > 0])
+            logger.info(f"  - Volume stats: min={min_volume:.0f}cm³, "
+                       f"max={max_volume:.0f}cm³, "
+                       f"avg={avg_volume:.0f}cm³")
         
         # Log top categories
         if 'product_category_name' in df.columns:
-            top_categories = df['product_category_name'].value_counts().head(5)
+            top_categories = top_k(df['product_category_name'], 5)
             logger.info(f"  - Top 5 categories: {', '.join([f'{cat}({count})' for cat, count in top_categories.items()])}")
         
         # Check photo statistics
         if 'product_photos_qty' in df.columns:
-            products_with_photos = (df['product_photos_qty'] > 0).sum()
-            logger.info(f"  - Products with photos: {products_with_photos:,} ({products_with_photos/len(df)*100:.1f}%)")
+            products_with_photos = np.count_nonzero(df['product_photos_qty'].to_numpy() > 0)
+            logger.info(f"  - Products with photos: {products_with_photos:,} ({products_with_photos/n_rows*100:.1f}%)")
         
         logger.info("✓ Product data quality validation passed")
 
@@ -3,29 +3,115 @@ Extract reviews data from CSV
 Includes review score analysis and sentiment validation
 """
 
+import logging
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import sys
 import os
+from dataclasses import dataclass, field
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from src.utils.logger import setup_logger
-import yaml
+from src.utils.csv_reader import read_table, iter_csv
+from src.utils.column_stats import merge_distinct
+from src.extract.base_extractor import BaseExtractor
 
 logger = setup_logger('extract_reviews')
 
+REVIEW_DATE_COLS = [
+    'review_creation_date',
+    'review_answer_timestamp'
+]
 
-class ReviewsExtractor:
+
+@dataclass
+class _ReviewStats:
+    """
+    Running review aggregates, updated one chunk at a time so validation
+    never needs the whole file in memory
+    """
+    
+    n_rows: int = 0
+    # {column: null count}
+    nulls: dict = field(default_factory=dict)
+    # Row count per review_score 0-5 (None if the column is absent);
+    # scores outside that range are only counted in scores_out_of_range
+    score_counts: np.ndarray = None
+    scores_out_of_range: int = 0
+    score_sum: float = 0.0
+    duplicate_ids: int = 0
+    # Distinct ids seen so far, as Arrow arrays (None if the column is absent)
+    review_ids: pa.Array = None
+    order_ids: pa.Array = None
+    
+    def update(self, df, null_counts=None):
+        """
+        Fold one chunk into the aggregates
+        
+        Args:
+            df: Chunk of reviews
+            null_counts: Optional {column: null count} for the chunk, e.g. read
+                from Arrow validity bitmaps; computed with isna() otherwise
+        """
+        self.n_rows += len(df)
+        # Column presence is checked against a set built once per chunk
+        columns = set(df.columns)
+        if null_counts is None:
+            # One isna() pass over all columns instead of one per check
+            null_counts = df.isna().sum().to_dict()
+        for col, missing in null_counts.items():
+            self.nulls[col] = self.nulls.get(col, 0) + int(missing)
+        
+        # The score column is read once: one bincount gives the distribution,
+        # invalid count, mean and sentiment buckets
+        if 'review_score' in columns:
+            scores = df['review_score']
+            if scores.hasnans:
+                scores = scores.dropna()
+            # int8 scores are used as-is (no copy); float/Int8 columns with
+            # nulls are narrowed once the nulls are dropped
+            scores = scores.to_numpy(dtype=np.int8)
+            in_range = (scores >= 0) & (scores <= 5)
+            counts = np.bincount(scores[in_range].astype(np.intp, copy=False), minlength=6)
+            if self.score_counts is None:
+                self.score_counts = counts
+            else:
+                self.score_counts += counts
+            self.scores_out_of_range += int(scores.size - counts.sum())
+            self.score_sum += float(scores.sum(dtype=np.float64))
+        
+        # Duplicates across chunks: ids already seen in earlier chunks count too.
+        # Arrow hashes the strings, no per-row Python objects or boolean mask
+        if 'review_id' in columns:
+            seen_before = 0 if self.review_ids is None else len(self.review_ids)
+            self.review_ids = merge_distinct(df['review_id'], self.review_ids)
+            n_ids = len(df) - int(null_counts['review_id'])
+            self.duplicate_ids += n_ids - (len(self.review_ids) - seen_before)
+        
+        if 'order_id' in columns:
+            self.order_ids = merge_distinct(df['order_id'], self.order_ids)
+    
+    def score_mean(self):
+        """Mean review_score over non-null scores"""
+        n_scores = self.score_counts.sum() + self.scores_out_of_range
+        return self.score_sum / n_scores if n_scores else np.nan
+
+
+class ReviewsExtractor(BaseExtractor):
     """Extract and validate reviews data"""
     
+    source_name = 'reviews'
+    
     def __init__(self, config_path='config/file_paths.yaml'):
         """Initialize with file paths from config"""
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
-        self.file_path = config['data_paths']['reviews']
+        super().__init__(config_path)
+        # Review messages contain line breaks inside quoted values
+        self.read_options['newlines_in_values'] = True
         logger.info(f"ReviewsExtractor initialized with path: {self.file_path}")
     
-    def extract(self):
+    def _extract_raw(self):
         """
         Extract reviews data from CSV
         
@@ -35,35 +121,38 @@ class ReviewsExtractor:
         try:
             logger.info("Starting reviews extraction...")
             
-            # Read CSV
-            df = pd.read_csv(self.file_path)
+            # Read CSV (PyArrow multi-threaded parser); only the schema's columns
+            # are read and the date columns are parsed as timestamps by Arrow
+            table = read_table(self.file_path, dtypes=self.dtypes, **self.read_options)
+            df = table.to_pandas()
+            # Null counts are stored in the Arrow columns already: no per-row
+            # isna()/notna() scans over the string columns
+            null_counts = {name: table.column(name).null_count for name in table.column_names}
             logger.info(f"✓ Loaded {len(df):,} rows from {self.file_path}")
             
-            # Parse date columns
-            date_columns = [
-                'review_creation_date',
-                'review_answer_timestamp'
-            ]
+            # Fall back to pandas for any date column that came back untyped,
+            # coercing bad values to NaT as before
+            unparsed = [col for col in REVIEW_DATE_COLS if not pd.api.types.is_datetime64_any_dtype(df[col])]
+            if unparsed:
+                df = df.assign(**{
+                    col: pd.to_datetime(df[col], format=self.timestamp_format, errors='coerce')
+                    for col in unparsed
+                })
+                logger.info(f"✓ Parsed date columns: {', '.join(unparsed)}")
+                # Coercion can add NaT the parsed table did not have
+                null_counts.update(df[unparsed].isna().sum().to_dict())
             
-            for col in date_columns:
-                if col in df.columns:
-                    df[col] = pd.to_datetime(df[col], errors='coerce')
-                    logger.info(f"✓ Parsed date column: {col}")
+            # Missing scores make Arrow hand back float64 (8 bytes/row); keep
+            # them as nullable Int8 instead (the int8 parse already rejected
+            # anything that is not a small whole number)
+            if 'review_score' in df.columns and df['review_score'].dtype.kind == 'f':
+                df = df.assign(review_score=df['review_score'].astype('Int8'))
             
-            # Basic info logging
-            if 'order_id' in df.columns:
-                logger.info(f"  - Orders with reviews: {df['order_id'].nunique():,}")
-            
-            if 'review_score' in df.columns:
-                logger.info(f"  - Average review score: {df['review_score'].mean():.2f}/5.0")
-                logger.info(f"  - Review score distribution:")
-                score_dist = df['review_score'].value_counts().sort_index()
-                for score, count in score_dist.items():
-                    percentage = (count / len(df)) * 100
-                    logger.info(f"    → {score} stars: {count:,} ({percentage:.1f}%)")
-            
-            # Validate data quality
-            self._validate_data(df)
+            # Aggregate once, then log and validate from the aggregates
+            stats = _ReviewStats()
+            stats.update(df, null_counts)
+            self._log_summary(stats)
+            self._validate_data(stats)
             
             logger.info(f"✓ Reviews extraction complete: {len(df):,} rows")
             return df
@@ -72,25 +161,73 @@ class ReviewsExtractor:
             logger.error(f"✗ Reviews extraction failed: {e}")
             raise
     
-    def _validate_data(self, df):
-        """Validate reviews data quality"""
+    def extract(self, columns=None, *, return_frame=True, chunk_bytes=16 << 20):
+        """
+        Extract reviews data
+        
+        Args:
+            columns: Optional list of columns to return (see BaseExtractor.extract)
+            return_frame: False streams the CSV in chunks and only keeps the
+                running aggregates, so peak memory is one chunk (no DataFrame)
+            chunk_bytes: Bytes of CSV parsed per chunk when streaming
+        
+        Returns:
+            DataFrame: Reviews data, or _ReviewStats when return_frame is False
+        """
+        if return_frame:
+            return super().extract(columns)
+        
+        try:
+            logger.info("Starting streamed reviews profile...")
+            stats = _ReviewStats()
+            for chunk in iter_csv(self.file_path, dtypes=self.dtypes, block_size=chunk_bytes, **self.read_options):
+                stats.update(chunk)
+            logger.info(f"✓ Streamed {stats.n_rows:,} rows from {self.file_path}")
+            
+            self._log_summary(stats)
+            self._validate_data(stats)
+            return stats
+            
+        except Exception as e:
+            logger.error(f"✗ Reviews profile failed: {e}")
+            raise
+    
+    def _log_summary(self, stats):
+        """Log basic review info from the aggregated stats"""
+        # Informational only: skip all the number formatting when INFO is off
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        
+        if stats.order_ids is not None:
+            logger.info(f"  - Orders with reviews: {len(stats.order_ids):,}")
+        
+        if stats.score_counts is not None:
+            logger.info(f"  - Average review score: {stats.score_mean():.2f}/5.0")
+            logger.info(f"  - Review score distribution:")
+            counts = stats.score_counts
+            percentages = counts * (100.0 / stats.n_rows)
+            for score in np.flatnonzero(counts):
+                logger.info(f"    → {score} stars: {counts[score]:,} ({percentages[score]:.1f}%)")
+    
+    def _validate_data(self, stats):
+        """Validate reviews data quality from the aggregated stats"""
+        n_rows = stats.n_rows
         
         # Check for missing review_id (should be unique)
-        if 'review_id' in df.columns:
-            duplicate_reviews = df['review_id'].duplicated().sum()
-            if duplicate_reviews > 0:
-                logger.warning(f"⚠ Found {duplicate_reviews} duplicate review_ids")
+        if 'review_id' in stats.nulls:
+            if stats.duplicate_ids > 0:
+                logger.warning(f"⚠ Found {stats.duplicate_ids} duplicate review_ids")
             else:
                 logger.info("✓ No duplicate review_ids")
             
-            missing_review_id = df['review_id'].isnull().sum()
+            missing_review_id = stats.nulls['review_id']
             if missing_review_id > 0:
                 logger.error(f"✗ Missing review_id: {missing_review_id} nulls")
                 raise ValueError("review_id cannot be null")
         
         # Check for missing order_id
-        if 'order_id' in df.columns:
-            missing_order_id = df['order_id'].isnull().sum()
+        if 'order_id' in stats.nulls:
+            missing_order_id = stats.nulls['order_id']
             if missing_order_id > 0:
                 logger.error(f"✗ Missing order_id: {missing_order_id} nulls")
                 raise ValueError("order_id cannot be null in reviews")
@@ -98,42 +235,45 @@ class ReviewsExtractor:
                 logger.info("✓ No missing order_ids")
         
         # Check review scores
-        if 'review_score' in df.columns:
-            missing_scores = df['review_score'].isnull().sum()
+        if stats.score_counts is not None:
+            scores = stats.score_counts
+            missing_scores = stats.nulls['review_score']
             if missing_scores > 0:
-                logger.warning(f"⚠ Missing review_score: {missing_scores} nulls ({missing_scores/len(df)*100:.2f}%)")
+                logger.warning(f"⚠ Missing review_score: {missing_scores} nulls ({missing_scores/n_rows*100:.2f}%)")
             
             # Check for invalid scores (should be 1-5)
-            invalid_scores = df[(df['review_score'] < 1) | (df['review_score'] > 5)]
-            if len(invalid_scores) > 0:
-                logger.error(f"✗ Invalid review scores (not 1-5): {len(invalid_scores)}")
+            invalid_scores = scores[0] + stats.scores_out_of_range
+            if invalid_scores > 0:
+                logger.error(f"✗ Invalid review scores (not 1-5): {invalid_scores}")
             else:
                 logger.info("✓ All review scores are valid (1-5)")
         
-        # Check review comments
-        if 'review_comment_title' in df.columns:
-            reviews_with_title = df['review_comment_title'].notna().sum()
-            logger.info(f"  - Reviews with title: {reviews_with_title:,} ({reviews_with_title/len(df)*100:.1f}%)")
-        
-        if 'review_comment_message' in df.columns:
-            reviews_with_message = df['review_comment_message'].notna().sum()
-            logger.info(f"  - Reviews with message: {reviews_with_message:,} ({reviews_with_message/len(df)*100:.1f}%)")
-        
-        # Check review answer timestamp (seller responses)
-        if 'review_answer_timestamp' in df.columns:
-            reviews_with_answer = df['review_answer_timestamp'].notna().sum()
-            logger.info(f"  - Reviews with seller answer: {reviews_with_answer:,} ({reviews_with_answer/len(df)*100:.1f}%)")
-        
-        # Analyze sentiment (simple categorization)
-        if 'review_score' in df.columns:
-            positive_reviews = (df['review_score'] >= 4).sum()
-            neutral_reviews = (df['review_score'] == 3).sum()
-            negative_reviews = (df['review_score'] <= 2).sum()
+        # The rest is informational only: skip it when INFO is off
+        if logger.isEnabledFor(logging.INFO):
+            # Check review comments
+            if 'review_comment_title' in stats.nulls:
+                reviews_with_title = n_rows - stats.nulls['review_comment_title']
+                logger.info(f"  - Reviews with title: {reviews_with_title:,} ({reviews_with_title/n_rows*100:.1f}%)")
+            
+            if 'review_comment_message' in stats.nulls:
+                reviews_with_message = n_rows - stats.nulls['review_comment_message']
+                logger.info(f"  - Reviews with message: {reviews_with_message:,} ({reviews_with_message/n_rows*100:.1f}%)")
+            
+            # Check review answer timestamp (seller responses)
+            if 'review_answer_timestamp' in stats.nulls:
+                reviews_with_answer = n_rows - stats.nulls['review_answer_timestamp']
+                logger.info(f"  - Reviews with seller answer: {reviews_with_answer:,} ({reviews_with_answer/n_rows*100:.1f}%)")
             
-            logger.info(f"  - Sentiment breakdown:")
-            logger.info(f"    → Positive (4-5 stars): {positive_reviews:,} ({positive_reviews/len(df)*100:.1f}%)")
-            logger.info(f"    → Neutral (3 stars): {neutral_reviews:,} ({neutral_reviews/len(df)*100:.1f}%)")
-            logger.info(f"    → Negative (1-2 stars): {negative_reviews:,} ({negative_reviews/len(df)*100:.1f}%)")
+            # Analyze sentiment (simple categorization)
+            if stats.score_counts is not None:
+                positive_reviews = scores[4] + scores[5]
+                neutral_reviews = scores[3]
+                negative_reviews = scores[1] + scores[2]
+                
+                logger.info(f"  - Sentiment breakdown:")
+                logger.info(f"    → Positive (4-5 stars): {positive_reviews:,} ({positive_reviews/n_rows*100:.1f}%)")
+                logger.info(f"    → Neutral (3 stars): {neutral_reviews:,} ({neutral_reviews/n_rows*100:.1f}%)")
+                logger.info(f"    → Negative (1-2 stars): {negative_reviews:,} ({negative_reviews/n_rows*100:.1f}%)")
         
         logger.info("✓ Review data quality validation passed")
 
@@ -5,6 +5,7 @@ Validates data integrity and referential relationships
 
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
@@ -17,47 +18,73 @@ logger = setup_logger('data_quality_check')
 class DataQualityChecker:
     """Check data quality in the data warehouse"""
     
-    def __init__(self):
-        """Initialize data quality checker"""
-        self.db = DatabaseConnector()
+    def __init__(self, db=None):
+        """
+        Initialize data quality checker
+        
+        Args:
+            db: Shared DatabaseConnector (a new one is created if omitted)
+        """
+        # Only close the pool if this object created it
+        self._owns_db = db is None
+        self.db = db or DatabaseConnector()
         logger.info("DataQualityChecker initialized")
     
-    def run_all_checks(self):
-        """Run all data quality checks"""
+    def run_all_checks(self, exact=False):
+        """
+        Run all data quality checks
+        
+        Args:
+            exact: Use exact row counts (full scans) instead of catalog estimates
+        """
         try:
-            print("\n" + "="*80)
-            print("DATA QUALITY REPORT")
-            print("="*80 + "\n")
+            report = ["", "="*80, "DATA QUALITY REPORT", "="*80, ""]
             
-            # 1. Row counts
-            self._check_row_counts()
+            # Sections are independent except 3-5, which share one scan of
+            # fact_orders; run them concurrently on the connection pool and
+            # collect each section's lines in report order
+            with ThreadPoolExecutor(max_workers=5) as executor:
+                fact_stats = executor.submit(self._gather_fact_orders_stats)
+                sections = [
+                    # 1. Row counts
+                    executor.submit(self._check_row_counts, exact),
+                    # 2. Referential integrity
+                    executor.submit(self._check_referential_integrity),
+                    # 3. NULL values
+                    executor.submit(lambda: self._check_null_values(fact_stats.result())),
+                    # 4. Data consistency
+                    executor.submit(lambda: self._check_data_consistency(fact_stats.result())),
+                    # 5. Business logic validation
+                    executor.submit(lambda: self._check_business_logic(fact_stats.result()))
+                ]
+                
+                for section in sections:
+                    report.extend(section.result())
             
-            # 2. Referential integrity
-            self._check_referential_integrity()
+            report += ["", "="*80, "✓ DATA QUALITY CHECK COMPLETE", "="*80, ""]
             
-            # 3. NULL values
-            self._check_null_values()
-            
-            # 4. Data consistency
-            self._check_data_consistency()
-            
-            # 5. Business logic validation
-            self._check_business_logic()
-            
-            print("\n" + "="*80)
-            print("✓ DATA QUALITY CHECK COMPLETE")
-            print("="*80 + "\n")
+            # The whole report in one write instead of one print() per line
+            sys.stdout.write('\n'.join(report) + '\n')
             
         except Exception as e:
             logger.error(f"✗ Data quality check failed: {e}")
             raise
         finally:
-            self.db.close_pool()
+            if self._owns_db:
+                self.db.close_pool()
     
-    def _check_row_counts(self):
-        """Check row counts for all tables"""
-        print("[1/5] ROW COUNTS")
-        print("-" * 80)
+    def _check_row_counts(self, exact=False):
+        """
+        Check row counts for all tables
+        
+        Args:
+            exact: Scan each table with COUNT(*); by default the live-row
+                estimates from pg_stat_user_tables are read in one catalog lookup
+        
+        Returns:
+            list: Report lines for the section
+        """
+        lines = ["[1/5] ROW COUNTS", "-" * 80]
         
         tables = [
             'dim_date',
@@ -68,153 +95,147 @@ class DataQualityChecker:
             'fact_cohort_retention'
         ]
         
+        if exact:
+            counts = {}
+            for table in tables:
+                query = f"SELECT COUNT(*) FROM {table};"
+                counts[table] = self.db.fetch_query(query)[0][0]
+        else:
+            query = """
+            SELECT relname, n_live_tup
+            FROM pg_stat_user_tables
+            WHERE relname = ANY(%s::text[]);
+            """
+            counts = dict(self.db.fetch_query(query, (tables,)))
+        
         for table in tables:
-            query = f"SELECT COUNT(*) FROM {table};"
-            result = self.db.fetch_query(query)
-            count = result[0][0]
-            print(f"  {table:25} : {count:>10,} rows")
+            count = counts.get(table, 0)
+            lines.append(f"  {table:25} : {count:>10,} rows{'' if exact else ' (estimate)'}")
+        
+        lines.append('')
         
-        print()
+        return lines
     
     def _check_referential_integrity(self):
         """Check referential integrity between fact and dimension tables"""
-        print("[2/5] REFERENTIAL INTEGRITY")
-        print("-" * 80)
-        
-        # Check customer_key
-        query = """
-        SELECT COUNT(*) as total_rows,
-               COUNT(DISTINCT f.customer_key) as unique_customer_keys,
-               COUNT(DISTINCT c.customer_key) as matched_customer_keys,
-               COUNT(DISTINCT f.customer_key) - COUNT(DISTINCT c.customer_key) as orphaned_keys
-        FROM fact_orders f
-        LEFT JOIN dim_customers c ON f.customer_key = c.customer_key;
-        """
-        result = self.db.fetch_query(query)
-        total, unique, matched, orphaned = result[0]
-        
-        print(f"  Customer Keys:")
-        print(f"    - Total orders              : {total:>10,}")
-        print(f"    - Unique customer keys      : {unique:>10,}")
-        print(f"    - Matched in dim_customers  : {matched:>10,}")
-        print(f"    - Orphaned (no match)       : {orphaned:>10,}")
+        lines = ["[2/5] REFERENTIAL INTEGRITY", "-" * 80]
         
-        if orphaned > 0:
-            print(f"    ⚠ WARNING: {orphaned} customer keys have no matching dimension record")
-        else:
-            print(f"    ✓ All customer keys are valid")
-        
-        # Check product_key
-        query = """
-        SELECT COUNT(*) as total_rows,
-               COUNT(DISTINCT f.product_key) as unique_product_keys,
-               COUNT(DISTINCT p.product_key) as matched_product_keys,
-               COUNT(DISTINCT f.product_key) - COUNT(DISTINCT p.product_key) as orphaned_keys
-        FROM fact_orders f
-        LEFT JOIN dim_products p ON f.product_key = p.product_key;
-        """
-        result = self.db.fetch_query(query)
-        total, unique, matched, orphaned = result[0]
-        
-        print(f"\n  Product Keys:")
-        print(f"    - Total orders              : {total:>10,}")
-        print(f"    - Unique product keys       : {unique:>10,}")
-        print(f"    - Matched in dim_products   : {matched:>10,}")
-        print(f"    - Orphaned (no match)       : {orphaned:>10,}")
-        
-        if orphaned > 0:
-            print(f"    ⚠ WARNING: {orphaned} product keys have no matching dimension record")
-        else:
-            print(f"    ✓ All product keys are valid")
+        # (title, short name, fact column, dimension table, dimension key)
+        checks = [
+            ('Customer', 'customer', 'customer_key', 'dim_customers', 'customer_key'),
+            ('Product', 'product', 'product_key', 'dim_products', 'product_key'),
+            ('Date', 'date', 'order_date_key', 'dim_date', 'date_key'),
+            ('Payment Type', 'payment', 'payment_type_key', 'dim_payment_type', 'payment_type_key')
+        ]
         
-        # Check date_key
+        # One round trip for all four dimensions; the CTE is referenced four
+        # times, so Postgres materializes it and scans fact_orders only once.
+        # Orphans are the rows the join finds no dimension for (an anti-join
+        # on the dimension's primary key), not a difference of distinct
+        # counts, which could cancel out and hide missing keys
+        branches = [
+            f"""
+        SELECT '{name}' as dimension,
+               COUNT(*) as total_rows,
+               COUNT(DISTINCT f.{fact_col}) as unique_keys,
+               COUNT(DISTINCT d.{dim_col}) as matched_keys,
+               COUNT(DISTINCT f.{fact_col}) FILTER (WHERE d.{dim_col} IS NULL) as orphaned_keys,
+               COUNT(f.{fact_col}) FILTER (WHERE d.{dim_col} IS NULL) as orphaned_rows
+        FROM f
+        LEFT JOIN {dim_table} d ON f.{fact_col} = d.{dim_col}"""
+            for _, name, fact_col, dim_table, dim_col in checks
+        ]
         query = """
-        SELECT COUNT(*) as total_rows,
-               COUNT(DISTINCT f.order_date_key) as unique_date_keys,
-               COUNT(DISTINCT d.date_key) as matched_date_keys,
-               COUNT(DISTINCT f.order_date_key) - COUNT(DISTINCT d.date_key) as orphaned_keys
-        FROM fact_orders f
-        LEFT JOIN dim_date d ON f.order_date_key = d.date_key;
-        """
-        result = self.db.fetch_query(query)
-        total, unique, matched, orphaned = result[0]
-        
-        print(f"\n  Date Keys:")
-        print(f"    - Total orders              : {total:>10,}")
-        print(f"    - Unique date keys          : {unique:>10,}")
-        print(f"    - Matched in dim_date       : {matched:>10,}")
-        print(f"    - Orphaned (no match)       : {orphaned:>10,}")
-        
-        if orphaned > 0:
-            print(f"    ⚠ WARNING: {orphaned} date keys have no matching dimension record")
-        else:
-            print(f"    ✓ All date keys are valid")
+        WITH f AS (
+            SELECT customer_key, product_key, order_date_key, payment_type_key
+            FROM fact_orders
+        )""" + "\n        UNION ALL".join(branches) + ";"
         
-        # Check payment_type_key
-        query = """
-        SELECT COUNT(*) as total_rows,
-               COUNT(DISTINCT f.payment_type_key) as unique_payment_keys,
-               COUNT(DISTINCT pt.payment_type_key) as matched_payment_keys,
-               COUNT(DISTINCT f.payment_type_key) - COUNT(DISTINCT pt.payment_type_key) as orphaned_keys
-        FROM fact_orders f
-        LEFT JOIN dim_payment_type pt ON f.payment_type_key = pt.payment_type_key;
-        """
-        result = self.db.fetch_query(query)
-        total, unique, matched, orphaned = result[0]
+        results = {row[0]: row[1:] for row in self.db.fetch_query(query)}
         
-        print(f"\n  Payment Type Keys:")
-        print(f"    - Total orders              : {total:>10,}")
-        print(f"    - Unique payment keys       : {unique:>10,}")
-        print(f"    - Matched in dim_payment    : {matched:>10,}")
-        print(f"    - Orphaned (no match)       : {orphaned:>10,}")
+        for i, (title, name, _, dim_table, _) in enumerate(checks):
+            total, unique, matched, orphaned, orphaned_rows = results[name]
+            
+            if i > 0:
+                lines.append('')
+            lines.append(f"  {title} Keys:")
+            lines.append(f"    - Total orders              : {total:>10,}")
+            lines.append(f"    - {'Unique ' + name + ' keys':26}: {unique:>10,}")
+            lines.append(f"    - {'Matched in ' + dim_table.replace('_type', ''):26}: {matched:>10,}")
+            lines.append(f"    - Orphaned (no match)       : {orphaned:>10,}")
+            
+            if orphaned > 0:
+                lines.append(f"    ⚠ WARNING: {orphaned} {name} keys ({orphaned_rows:,} orders) have no matching dimension record")
+            else:
+                lines.append(f"    ✓ All {name} keys are valid")
         
-        if orphaned > 0:
-            print(f"    ⚠ WARNING: {orphaned} payment keys have no matching dimension record")
-        else:
-            print(f"    ✓ All payment keys are valid")
+        lines.append('')
         
-        print()
+        return lines
     
-    def _check_null_values(self):
-        """Check for NULL values in critical fields"""
-        print("[3/5] NULL VALUE CHECKS")
-        print("-" * 80)
+    def _gather_fact_orders_stats(self):
+        """
+        Compute every fact_orders aggregate used by the NULL, consistency and
+        business logic sections in a single table scan
         
-        # Check fact_orders
+        Returns:
+            dict: {aggregate name: value}
+        """
         query = """
         SELECT 
+            COUNT(*) as total_rows,
             COUNT(*) FILTER (WHERE customer_key IS NULL) as null_customer_keys,
             COUNT(*) FILTER (WHERE product_key IS NULL) as null_product_keys,
             COUNT(*) FILTER (WHERE order_date_key IS NULL) as null_order_date_keys,
             COUNT(*) FILTER (WHERE payment_type_key IS NULL) as null_payment_keys,
             COUNT(*) FILTER (WHERE order_id IS NULL) as null_order_ids,
             COUNT(*) FILTER (WHERE order_total_value IS NULL) as null_order_values,
-            COUNT(*) as total_rows
+            COUNT(*) FILTER (WHERE order_total_value < 0) as negative_values,
+            COUNT(*) FILTER (WHERE order_total_value = 0) as zero_values,
+            COUNT(*) FILTER (WHERE delivery_days < 0) as negative_delivery_days,
+            COUNT(*) FILTER (WHERE is_completed_order = TRUE) as completed_orders,
+            COUNT(*) FILTER (WHERE is_late_delivery = TRUE) as late_deliveries,
+            AVG(delivery_days) as avg_delivery_days,
+            AVG(order_total_value) as avg_order_value
         FROM fact_orders;
         """
+        names = [
+            'total_rows',
+            'null_customer_keys', 'null_product_keys', 'null_order_date_keys',
+            'null_payment_keys', 'null_order_ids', 'null_order_values',
+            'negative_values', 'zero_values', 'negative_delivery_days',
+            'completed_orders', 'late_deliveries',
+            'avg_delivery_days', 'avg_order_value'
+        ]
         result = self.db.fetch_query(query)
-        null_cust, null_prod, null_date, null_pay, null_id, null_val, total = result[0]
+        return dict(zip(names, result[0]))
+    
+    def _check_null_values(self, fact_stats):
+        """Check for NULL values in critical fields"""
+        lines = ["[3/5] NULL VALUE CHECKS", "-" * 80]
         
-        print(f"  fact_orders (Total: {total:,} rows):")
+        # Check fact_orders
+        total = fact_stats['total_rows']
+        lines.append(f"  fact_orders (Total: {total:,} rows):")
         
         checks = [
-            ("customer_key", null_cust),
-            ("product_key", null_prod),
-            ("order_date_key", null_date),
-            ("payment_type_key", null_pay),
-            ("order_id", null_id),
-            ("order_total_value", null_val)
+            ("customer_key", fact_stats['null_customer_keys']),
+            ("product_key", fact_stats['null_product_keys']),
+            ("order_date_key", fact_stats['null_order_date_keys']),
+            ("payment_type_key", fact_stats['null_payment_keys']),
+            ("order_id", fact_stats['null_order_ids']),
+            ("order_total_value", fact_stats['null_order_values'])
         ]
         
         has_nulls = False
         for field, null_count in checks:
             if null_count > 0:
                 pct = (null_count / total * 100) if total > 0 else 0
-                print(f"    ⚠ {field:25} : {null_count:>7,} NULLs ({pct:.2f}%)")
+                lines.append(f"    ⚠ {field:25} : {null_count:>7,} NULLs ({pct:.2f}%)")
                 has_nulls = True
         
         if not has_nulls:
-            print(f"    ✓ No NULL values in critical fields")
+            lines.append(f"    ✓ No NULL values in critical fields")
         
         # Check dim_customers
         query = """
@@ -227,74 +248,81 @@ class DataQualityChecker:
         result = self.db.fetch_query(query)
         null_id, null_seg, total = result[0]
         
-        print(f"\n  dim_customers (Total: {total:,} rows):")
+        lines.append(f"\n  dim_customers (Total: {total:,} rows):")
         if null_id > 0 or null_seg > 0:
             if null_id > 0:
-                print(f"    ⚠ customer_id                : {null_id:>7,} NULLs")
+                lines.append(f"    ⚠ customer_id                : {null_id:>7,} NULLs")
             if null_seg > 0:
-                print(f"    ⚠ customer_segment           : {null_seg:>7,} NULLs")
+                lines.append(f"    ⚠ customer_segment           : {null_seg:>7,} NULLs")
         else:
-            print(f"    ✓ No NULL values in critical fields")
+            lines.append(f"    ✓ No NULL values in critical fields")
+        
+        lines.append('')
         
-        print()
+        return lines
     
-    def _check_data_consistency(self):
+    def _check_data_consistency(self, fact_stats):
         """Check data consistency and logical errors"""
-        print("[4/5] DATA CONSISTENCY")
-        print("-" * 80)
+        lines = ["[4/5] DATA CONSISTENCY", "-" * 80]
         
         # Check negative values
-        query = """
-        SELECT 
-            COUNT(*) FILTER (WHERE order_total_value < 0) as negative_values,
-            COUNT(*) FILTER (WHERE order_total_value = 0) as zero_values,
-            COUNT(*) FILTER (WHERE delivery_days < 0) as negative_delivery_days
-        FROM fact_orders;
-        """
-        result = self.db.fetch_query(query)
-        neg_val, zero_val, neg_days = result[0]
+        neg_val = fact_stats['negative_values']
+        zero_val = fact_stats['zero_values']
+        neg_days = fact_stats['negative_delivery_days']
         
-        print(f"  Numeric Validity:")
+        lines.append(f"  Numeric Validity:")
         if neg_val > 0:
-            print(f"    ⚠ Negative order values      : {neg_val:>7,} rows")
+            lines.append(f"    ⚠ Negative order values      : {neg_val:>7,} rows")
         else:
-            print(f"    ✓ No negative order values")
+            lines.append(f"    ✓ No negative order values")
         
         if zero_val > 0:
-            print(f"    ⚠ Zero order values          : {zero_val:>7,} rows")
+            lines.append(f"    ⚠ Zero order values          : {zero_val:>7,} rows")
         else:
-            print(f"    ✓ No zero order values")
+            lines.append(f"    ✓ No zero order values")
         
         if neg_days > 0:
-            print(f"    ⚠ Negative delivery days     : {neg_days:>7,} rows")
+            lines.append(f"    ⚠ Negative delivery days     : {neg_days:>7,} rows")
         else:
-            print(f"    ✓ No negative delivery days")
+            lines.append(f"    ✓ No negative delivery days")
         
-        # Check duplicates
+        # Check duplicates: first an early-exit probe - order_id has a unique
+        # btree index, so the grouped scan walks it in order and stops at the
+        # first repeated id; only count them when there is one
         query = """
-        SELECT COUNT(*) as duplicate_count
-        FROM (
-            SELECT order_id, COUNT(*) as cnt
+        SELECT EXISTS (
+            SELECT 1
             FROM fact_orders
             GROUP BY order_id
             HAVING COUNT(*) > 1
-        ) duplicates;
+        );
         """
-        result = self.db.fetch_query(query)
-        dup_count = result[0][0]
-        
-        print(f"\n  Uniqueness:")
+        dup_count = 0
+        if self.db.fetch_query(query)[0][0]:
+            query = """
+            SELECT COUNT(*) as duplicate_count
+            FROM (
+                SELECT order_id
+                FROM fact_orders
+                GROUP BY order_id
+                HAVING COUNT(*) > 1
+            ) duplicates;
+            """
+            dup_count = self.db.fetch_query(query)[0][0]
+        
+        lines.append(f"\n  Uniqueness:")
         if dup_count > 0:
-            print(f"    ⚠ Duplicate order_ids        : {dup_count:>7,} duplicates")
+            lines.append(f"    ⚠ Duplicate order_ids        : {dup_count:>7,} duplicates")
         else:
-            print(f"    ✓ All order_ids are unique")
+            lines.append(f"    ✓ All order_ids are unique")
+        
+        lines.append('')
         
-        print()
+        return lines
     
-    def _check_business_logic(self):
+    def _check_business_logic(self, fact_stats):
         """Check business logic validation"""
-        print("[5/5] BUSINESS LOGIC VALIDATION")
-        print("-" * 80)
+        lines = ["[5/5] BUSINESS LOGIC VALIDATION", "-" * 80]
         
         # Check order status distribution
         query = """
@@ -303,37 +331,31 @@ class DataQualityChecker:
             COUNT(*) as count,
             ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (), 2) as percentage
         FROM fact_orders
-        GROUP BY order_status
-        ORDER BY count DESC;
+        GROUP BY order_status;
         """
-        result = self.db.fetch_query(query)
+        # A handful of groups: sort them here rather than adding a sort node
+        result = sorted(self.db.fetch_query(query), key=lambda row: row[1], reverse=True)
         
-        print(f"  Order Status Distribution:")
+        lines.append(f"  Order Status Distribution:")
         for status, count, pct in result:
-            print(f"    - {status:20} : {count:>10,} ({pct:>5.2f}%)")
+            lines.append(f"    - {status:20} : {count:>10,} ({pct:>5.2f}%)")
         
         # Check completed orders metrics
-        query = """
-        SELECT 
-            COUNT(*) as total_orders,
-            COUNT(*) FILTER (WHERE is_completed_order = TRUE) as completed_orders,
-            COUNT(*) FILTER (WHERE is_late_delivery = TRUE) as late_deliveries,
-            AVG(delivery_days) as avg_delivery_days,
-            AVG(order_total_value) as avg_order_value
-        FROM fact_orders;
-        """
-        result = self.db.fetch_query(query)
-        total, completed, late, avg_days, avg_value = result[0]
+        total = fact_stats['total_rows']
+        completed = fact_stats['completed_orders']
+        late = fact_stats['late_deliveries']
+        avg_days = fact_stats['avg_delivery_days']
+        avg_value = fact_stats['avg_order_value']
         
         completion_rate = (completed / total * 100) if total > 0 else 0
         late_rate = (late / total * 100) if total > 0 else 0
         
-        print(f"\n  Order Metrics:")
-        print(f"    - Total orders               : {total:>10,}")
-        print(f"    - Completed orders           : {completed:>10,} ({completion_rate:.2f}%)")
-        print(f"    - Late deliveries            : {late:>10,} ({late_rate:.2f}%)")
-        print(f"    - Average delivery days      : {avg_days:>10.1f} days")
-        print(f"    - Average order value        : R$ {avg_value:>10,.2f}")
+        lines.append(f"\n  Order Metrics:")
+        lines.append(f"    - Total orders               : {total:>10,}")
+        lines.append(f"    - Completed orders           : {completed:>10,} ({completion_rate:.2f}%)")
+        lines.append(f"    - Late deliveries            : {late:>10,} ({late_rate:.2f}%)")
+        lines.append(f"    - Average delivery days      : {avg_days:>10.1f} days")
+        lines.append(f"    - Average order value        : R$ {avg_value:>10,.2f}")
         
         # Check customer segments
         query = """
@@ -342,19 +364,20 @@ class DataQualityChecker:
             COUNT(*) as customer_count,
             AVG(lifetime_value) as avg_clv
         FROM dim_customers
-        GROUP BY customer_segment
-        ORDER BY customer_count DESC;
+        GROUP BY customer_segment;
         """
-        result = self.db.fetch_query(query)
+        result = sorted(self.db.fetch_query(query), key=lambda row: row[1], reverse=True)
         
-        print(f"\n  Customer Segments:")
+        lines.append(f"\n  Customer Segments:")
         for segment, count, avg_clv in result:
-            print(f"    - {segment:20} : {count:>7,} customers (Avg CLV: R$ {avg_clv:,.2f})")
+            lines.append(f"    - {segment:20} : {count:>7,} customers (Avg CLV: R$ {avg_clv:,.2f})")
+        
+        lines.append('')
         
-        print()
+        return lines
 
 
 # Main execution
 if __name__ == "__main__":
     checker = DataQualityChecker()
-    checker.run_all_checks()
+    checker.run_all_checks(exact='--exact' in sys.argv)
@@ -3,8 +3,10 @@ Create PostgreSQL schema for data warehouse
 Defines all dimension and fact tables WITHOUT foreign key constraints
 """
 
+import hashlib
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
@@ -13,95 +15,176 @@ from src.utils.db_connector import DatabaseConnector
 
 logger = setup_logger('create_schema')
 
+# Table comment prefix recording the fingerprint of the DDL a table was built from
+SCHEMA_COMMENT_PREFIX = 'etl_schema:'
+
 
 class SchemaCreator:
     """Create data warehouse schema in PostgreSQL"""
     
-    def __init__(self):
-        """Initialize schema creator"""
-        self.db = DatabaseConnector()
+    def __init__(self, db=None, unlogged=None):
+        """
+        Initialize schema creator
+        
+        Args:
+            db: Shared DatabaseConnector (a new one is created if omitted)
+            unlogged: Create UNLOGGED tables (no WAL on the bulk loads, but
+                emptied after a crash - fine for tables rebuilt from CSV on
+                every run); defaults to the DW_UNLOGGED=1 environment variable
+        """
+        # Only close the pool if this object created it
+        self._owns_db = db is None
+        self.db = db or DatabaseConnector()
+        if unlogged is None:
+            unlogged = os.getenv('DW_UNLOGGED') == '1'
+        self.unlogged = unlogged
         logger.info("SchemaCreator initialized")
     
-    def create_all_tables(self):
-        """Create all dimension and fact tables"""
+    def create_all_tables(self, with_indexes=True):
+        """
+        Create all dimension and fact tables
+        
+        Args:
+            with_indexes: Also create the secondary indexes; pass False before a
+                bulk load and call create_indexes() per table group afterwards,
+                so loaded rows don't maintain every B-tree one by one
+        """
         try:
             logger.info("Creating data warehouse schema...")
             
-            # Drop existing tables (in reverse dependency order)
-            logger.info("Dropping existing tables if they exist...")
-            self._drop_tables()
-            
-            # Create dimension tables first (no FK dependencies)
-            logger.info("\nCreating dimension tables...")
-            self._create_dim_date()
-            self._create_dim_products()
-            self._create_dim_payment_type()
-            self._create_dim_customers()
-            
-            # Create fact tables (depend on dimensions)
-            logger.info("\nCreating fact tables...")
-            self._create_fact_orders()
-            self._create_fact_cohort_retention()
-            
-            # Create indexes for performance
-            logger.info("\nCreating indexes...")
-            self._create_indexes()
-            
-            logger.info("\n" + "="*80)
-            logger.info("✓ DATA WAREHOUSE SCHEMA CREATED SUCCESSFULLY")
-            logger.info("="*80 + "\n")
-            
-            # Verify tables
-            self._verify_tables()
+            # Drop existing tables (in reverse dependency order), then
+            # dimension tables, fact tables and indexes
+            drops = self._drop_tables_sql()
+            tables = {
+                'dim_date': self._create_dim_date_sql(),
+                'dim_products': self._create_dim_products_sql(),
+                'dim_payment_type': self._create_dim_payment_type_sql(),
+                'dim_customers': self._create_dim_customers_sql(),
+                'fact_orders': self._create_fact_orders_sql(),
+                'fact_cohort_retention': self._create_fact_cohort_retention_sql()
+            }
+            if self.unlogged:
+                tables = {
+                    table: query.replace("CREATE TABLE ", "CREATE UNLOGGED TABLE ", 1)
+                    for table, query in tables.items()
+                }
+            indexes = self._create_indexes_sql() if with_indexes else []
+            fingerprint = self._schema_fingerprint(tables)
             
+            # One autocommit session for the catalog check, the DDL script
+            # and the verification, instead of a pool checkout per step
+            with self.db.ddl_session() as cur:
+                if self._schema_matches(cur, tables, fingerprint):
+                    # Same DDL as the existing tables: empty them instead of
+                    # dropping and recreating every table and index
+                    logger.info("Schema up-to-date, skipping DROP/CREATE (truncating tables)")
+                    cur.execute("\n".join(self._reset_tables_sql(tables, with_indexes)))
+                    logger.info(f"  ✓ Truncated {len(tables)} tables")
+                else:
+                    comments = [
+                        f"COMMENT ON TABLE {table} IS '{SCHEMA_COMMENT_PREFIX}{fingerprint}';"
+                        for table in tables
+                    ]
+                    
+                    # Send the whole DDL script at once: one round trip, and
+                    # Postgres runs a multi-statement query as one implicit
+                    # transaction, so a failure leaves the previous schema untouched
+                    logger.info("Dropping and recreating tables and indexes...")
+                    cur.execute("\n".join([*drops, *tables.values(), *comments, *indexes]))
+                    
+                    logger.info("  ✓ Dropped existing tables")
+                    for table in tables:
+                        logger.info(f"  ✓ Created {table}")
+                    logger.info(f"  ✓ Created {len(indexes)} indexes")
+                
+                logger.info("\n" + "="*80)
+                logger.info("✓ DATA WAREHOUSE SCHEMA CREATED SUCCESSFULLY")
+                logger.info("="*80 + "\n")
+                
+                # Verify tables
+                self._verify_tables(cur)
+                
         except Exception as e:
             logger.error(f"✗ Schema creation failed: {e}")
             raise
         finally:
-            self.db.close_pool()
+            if self._owns_db:
+                self.db.close_pool()
+    
+    def _schema_fingerprint(self, tables):
+        """Hash of the table DDL, stored as a comment on each created table"""
+        ddl = "\n".join(" ".join(query.split()) for query in tables.values())
+        return hashlib.md5(ddl.encode()).hexdigest()
+    
+    def _schema_matches(self, cur, tables, fingerprint):
+        """
+        Check (in one catalog query) that every table exists with this
+        fingerprint and persistence; always asked of the catalog, since
+        set_logged() or another process can change the tables in between
+        """
+        query = """
+        SELECT c.relname, obj_description(c.oid, 'pg_class'), c.relpersistence
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public'
+        AND c.relkind = 'r'
+        AND c.relname = ANY(%s::text[]);
+        """
+        cur.execute(query, (list(tables),))
+        found = {relname: (comment, persistence) for relname, comment, persistence in cur.fetchall()}
+        # set_logged() changes persistence without touching the DDL comment
+        expected = (f"{SCHEMA_COMMENT_PREFIX}{fingerprint}", 'u' if self.unlogged else 'p')
+        return all(found.get(table) == expected for table in tables)
+    
+    def _reset_tables_sql(self, tables, with_indexes):
+        """SQL to empty up-to-date tables and bring the secondary indexes in line"""
+        statements = [f"TRUNCATE {', '.join(tables)} RESTART IDENTITY;"]
+        if with_indexes:
+            statements += [
+                query.replace("CREATE INDEX ", "CREATE INDEX IF NOT EXISTS ", 1)
+                for query in self._create_indexes_sql()
+            ]
+        else:
+            # Bulk load follows: drop the indexes, create_indexes() rebuilds them
+            names = [query.split()[2] for query in self._create_indexes_sql()]
+            statements.append(f"DROP INDEX IF EXISTS {', '.join(names)};")
+        return statements
     
-    def _drop_tables(self):
-        """Drop existing tables in reverse dependency order"""
+    def _drop_tables_sql(self):
+        """SQL to drop existing tables in reverse dependency order"""
+        # One DROP statement for all tables: parsed and executed once
         drop_queries = [
-            "DROP TABLE IF EXISTS fact_cohort_retention CASCADE;",
-            "DROP TABLE IF EXISTS fact_orders CASCADE;",
-            "DROP TABLE IF EXISTS dim_customers CASCADE;",
-            "DROP TABLE IF EXISTS dim_payment_type CASCADE;",
-            "DROP TABLE IF EXISTS dim_products CASCADE;",
-            "DROP TABLE IF EXISTS dim_date CASCADE;"
+            "DROP TABLE IF EXISTS fact_cohort_retention, fact_orders, dim_customers, "
+            "dim_payment_type, dim_products, dim_date CASCADE;"
         ]
         
-        for query in drop_queries:
-            self.db.execute_query(query)
-        
-        logger.info("  ✓ Dropped existing tables")
+        return drop_queries
     
-    def _create_dim_date(self):
-        """Create date dimension table"""
+    def _create_dim_date_sql(self):
+        """SQL to create date dimension table"""
         query = """
         CREATE TABLE dim_date (
             date_key INTEGER PRIMARY KEY,
             full_date DATE NOT NULL UNIQUE,
-            year INTEGER NOT NULL,
-            quarter INTEGER NOT NULL,
-            month INTEGER NOT NULL,
+            year SMALLINT NOT NULL,
+            quarter SMALLINT NOT NULL,
+            month SMALLINT NOT NULL,
             month_name VARCHAR(20) NOT NULL,
-            week INTEGER NOT NULL,
-            day_of_month INTEGER NOT NULL,
-            day_of_week INTEGER NOT NULL,
+            week SMALLINT NOT NULL,
+            day_of_month SMALLINT NOT NULL,
+            day_of_week SMALLINT NOT NULL,
             day_name VARCHAR(20) NOT NULL,
             is_weekend BOOLEAN NOT NULL,
             is_holiday BOOLEAN NOT NULL,
-            fiscal_year INTEGER NOT NULL,
-            fiscal_quarter INTEGER NOT NULL,
+            fiscal_year SMALLINT NOT NULL,
+            fiscal_quarter SMALLINT NOT NULL,
             created_at TIMESTAMP NOT NULL
         );
         """
-        self.db.execute_query(query)
-        logger.info("  ✓ Created dim_date")
+        return query
     
-    def _create_dim_products(self):
-        """Create product dimension table"""
+    def _create_dim_products_sql(self):
+        """SQL to create product dimension table"""
         query = """
         CREATE TABLE dim_products (
             product_key INTEGER PRIMARY KEY,
@@ -119,11 +202,10 @@ class SchemaCreator:
             created_at TIMESTAMP NOT NULL
         );
         """
-        self.db.execute_query(query)
-        logger.info("  ✓ Created dim_products")
+        return query
     
-    def _create_dim_payment_type(self):
-        """Create payment type dimension table"""
+    def _create_dim_payment_type_sql(self):
+        """SQL to create payment type dimension table"""
         query = """
         CREATE TABLE dim_payment_type (
             payment_type_key INTEGER PRIMARY KEY,
@@ -132,11 +214,10 @@ class SchemaCreator:
             created_at TIMESTAMP NOT NULL
         );
         """
-        self.db.execute_query(query)
-        logger.info("  ✓ Created dim_payment_type")
+        return query
     
-    def _create_dim_customers(self):
-        """Create customer dimension table"""
+    def _create_dim_customers_sql(self):
+        """SQL to create customer dimension table"""
         query = """
         CREATE TABLE dim_customers (
             customer_key INTEGER PRIMARY KEY,
@@ -159,11 +240,10 @@ class SchemaCreator:
             updated_at TIMESTAMP NOT NULL
         );
         """
-        self.db.execute_query(query)
-        logger.info("  ✓ Created dim_customers")
+        return query
     
-    def _create_fact_orders(self):
-        """Create fact orders table WITHOUT foreign key constraints"""
+    def _create_fact_orders_sql(self):
+        """SQL to create fact orders table WITHOUT foreign key constraints"""
         query = """
         CREATE TABLE fact_orders (
             order_key BIGSERIAL PRIMARY KEY,
@@ -193,11 +273,10 @@ class SchemaCreator:
             created_at TIMESTAMP NOT NULL
         );
         """
-        self.db.execute_query(query)
-        logger.info("  ✓ Created fact_orders (NO FK constraints for flexibility)")
+        return query
     
-    def _create_fact_cohort_retention(self):
-        """Create cohort retention fact table"""
+    def _create_fact_cohort_retention_sql(self):
+        """SQL to create cohort retention fact table"""
         query = """
         CREATE TABLE fact_cohort_retention (
             cohort_retention_key SERIAL PRIMARY KEY,
@@ -210,11 +289,14 @@ class SchemaCreator:
             UNIQUE(cohort_month, months_since_first_purchase)
         );
         """
-        self.db.execute_query(query)
-        logger.info("  ✓ Created fact_cohort_retention")
+        return query
+    
+    def _create_indexes_sql(self):
+        """SQL to create indexes for query performance"""
+        return self._create_dim_indexes_sql() + self._create_fact_indexes_sql()
     
-    def _create_indexes(self):
-        """Create indexes for query performance"""
+    def _create_dim_indexes_sql(self):
+        """SQL to create dimension table indexes"""
         indexes = [
             # Date dimension indexes
             "CREATE INDEX idx_dim_date_full_date ON dim_date(full_date);",
@@ -228,8 +310,14 @@ class SchemaCreator:
             "CREATE INDEX idx_dim_customers_segment ON dim_customers(customer_segment);",
             "CREATE INDEX idx_dim_customers_region ON dim_customers(customer_region);",
             "CREATE INDEX idx_dim_customers_unique_id ON dim_customers(customer_unique_id);",
-            "CREATE INDEX idx_dim_customers_clv ON dim_customers(lifetime_value);",
-            
+            "CREATE INDEX idx_dim_customers_clv ON dim_customers(lifetime_value);"
+        ]
+        
+        return indexes
+    
+    def _create_fact_indexes_sql(self):
+        """SQL to create fact table indexes"""
+        indexes = [
             # Fact orders indexes (for fast queries even without FK constraints)
             "CREATE INDEX idx_fact_orders_customer_key ON fact_orders(customer_key);",
             "CREATE INDEX idx_fact_orders_product_key ON fact_orders(product_key);",
@@ -249,25 +337,84 @@ class SchemaCreator:
             "CREATE INDEX idx_fact_cohort_months_since ON fact_cohort_retention(months_since_first_purchase);"
         ]
         
-        for idx_query in indexes:
-            try:
-                self.db.execute_query(idx_query)
-            except Exception as e:
-                logger.warning(f"  ⚠ Index creation warning: {e}")
+        return indexes
+    
+    def create_indexes(self, group='all', concurrently=True, max_workers=8):
+        """
+        Create any missing indexes on already-loaded tables, in parallel
+        
+        Runs each index in its own pooled autocommit session; several indexes
+        build at once, including on the same table. (create_all_tables builds
+        the indexes inside its DDL transaction, where the tables are still empty.)
+        
+        Args:
+            group: 'dim', 'fact' or 'all' tables
+            concurrently: Use CREATE INDEX CONCURRENTLY so writers are not
+                blocked; a plain build is faster right after a bulk load,
+                when nothing else is writing
+            max_workers: Maximum number of indexes built at the same time
+        
+        Returns:
+            int: Number of indexes that failed (logged as warnings)
+        """
+        statements = {
+            'dim': self._create_dim_indexes_sql,
+            'fact': self._create_fact_indexes_sql,
+            'all': self._create_indexes_sql
+        }[group]()
+        prefix = "CREATE INDEX CONCURRENTLY IF NOT EXISTS " if concurrently else "CREATE INDEX IF NOT EXISTS "
+        indexes = [query.replace("CREATE INDEX ", prefix, 1) for query in statements]
         
-        logger.info(f"  ✓ Created {len(indexes)} indexes")
+        logger.info(f"Creating {len(indexes)} {group} indexes in parallel...")
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(indexes))) as executor:
+            errors = list(executor.map(self._create_index, indexes))
+        
+        # Collect failures instead of aborting: one bad index should not stop the rest
+        failed = 0
+        for query, error in zip(indexes, errors):
+            if error is not None:
+                failed += 1
+                logger.warning(f"  ⚠ Index creation warning ({query[:60]}...): {error}")
+        
+        logger.info(f"  ✓ Created {len(indexes) - failed}/{len(indexes)} indexes")
+        return failed
+    
+    def set_logged(self):
+        """
+        Make UNLOGGED tables crash-safe once the load is done: each table is
+        rewritten to WAL once, instead of WAL-logging every loaded row
+        """
+        tables = ['dim_date', 'dim_products', 'dim_payment_type', 'dim_customers',
+                  'fact_orders', 'fact_cohort_retention']
+        logger.info("Switching tables to LOGGED...")
+        self.db.execute_query("\n".join(f"ALTER TABLE {table} SET LOGGED;" for table in tables))
+        logger.info(f"  ✓ {len(tables)} tables are now logged")
     
-    def _verify_tables(self):
+    def _create_index(self, query):
+        """Run one CREATE INDEX (CONCURRENTLY is not allowed in a transaction block)"""
+        try:
+            with self.db.get_autocommit_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query)
+            return None
+        except Exception as e:
+            return e
+    
+    def _verify_tables(self, cur):
         """Verify all tables were created"""
+        # pg_class directly: information_schema.tables is a view with
+        # per-row privilege checks on top of the same catalog
         query = """
-        SELECT table_name 
-        FROM information_schema.tables 
-        WHERE table_schema = 'public' 
-        AND table_type = 'BASE TABLE'
-        ORDER BY table_name;
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public'
+        AND c.relkind IN ('r', 'p')
+        ORDER BY c.relname;
         """
         
-        tables = self.db.fetch_query(query)
+        cur.execute(query)
+        tables = cur.fetchall()
         
         logger.info("\nVerifying tables created:")
         for table in tables:
@@ -283,7 +430,14 @@ if __name__ == "__main__":
     print("="*80 + "\n")
     
     creator = SchemaCreator()
-    creator.create_all_tables()
+    if '--indexes-only' in sys.argv:
+        # Rebuild missing indexes on a loaded warehouse without recreating tables
+        try:
+            creator.create_indexes()
+        finally:
+            creator.db.close_pool()
+    else:
+        creator.create_all_tables()
     
     print("\n✓ Schema creation complete!")
     print("\nNext step: Load transformed data into tables")
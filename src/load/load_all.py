@@ -10,9 +10,8 @@ from datetime import datetime
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from src.utils.logger import setup_logger
+from src.utils.db_connector import DatabaseConnector
 from src.load.create_schema import SchemaCreator
-from src.load.load_dimensions import DimensionLoader
-from src.load.load_facts import FactLoader
 
 logger = setup_logger('load_orchestrator')
 
@@ -23,6 +22,8 @@ class LoadOrchestrator:
     def __init__(self):
         """Initialize load orchestrator"""
         self.start_time = None
+        # One connection pool (and one round of authentication) for all phases
+        self.db = DatabaseConnector()
         logger.info("LoadOrchestrator initialized")
     
     def run_complete_load(self):
@@ -34,23 +35,35 @@ class LoadOrchestrator:
             logger.info("STARTING COMPLETE LOAD PIPELINE")
             logger.info("="*80 + "\n")
             
-            # Phase 1: Create schema
+            # Phase 1: Create schema (secondary indexes are built after each
+            # load instead, so bulk-loaded rows don't update every B-tree)
             logger.info("PHASE 1: Creating Database Schema")
             logger.info("-" * 80)
-            schema_creator = SchemaCreator()
-            schema_creator.create_all_tables()
+            schema_creator = SchemaCreator(db=self.db)
+            schema_creator.create_all_tables(with_indexes=False)
             
-            # Phase 2: Load dimensions
+            # Phase 2: Load dimensions, then index them
             logger.info("\nPHASE 2: Loading Dimension Tables")
             logger.info("-" * 80)
-            dim_loader = DimensionLoader()
+            # Loaders are imported per phase: their pandas/PyArrow imports
+            # are only paid once the schema step has succeeded
+            from src.load.load_dimensions import DimensionLoader
+            dim_loader = DimensionLoader(db=self.db)
             dim_loader.load_all_dimensions()
+            schema_creator.create_indexes('dim', concurrently=False)
             
-            # Phase 3: Load facts
+            # Phase 3: Load facts, then index them
             logger.info("\nPHASE 3: Loading Fact Tables")
             logger.info("-" * 80)
-            fact_loader = FactLoader()
+            from src.load.load_facts import FactLoader
+            fact_loader = FactLoader(db=self.db)
             fact_loader.load_all_facts()
+            schema_creator.create_indexes('fact', concurrently=False)
+            
+            # UNLOGGED tables (DW_UNLOGGED=1) skip WAL during the loads;
+            # DW_SET_LOGGED=1 makes them durable again afterwards
+            if schema_creator.unlogged and os.getenv('DW_SET_LOGGED') == '1':
+                schema_creator.set_logged()
             
             # Summary
             self._print_summary()
@@ -60,6 +73,8 @@ class LoadOrchestrator:
             import traceback
             traceback.print_exc()
             raise
+        finally:
+            self.db.close_pool()
     
     def _print_summary(self):
         """Print pipeline execution summary"""
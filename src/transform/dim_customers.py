@@ -3,7 +3,6 @@ Transform Customers into Dimension with CLV and Segmentation
 Uses Polars for performance, Pandas for complex logic
 """
 
-import pandas as pd
 import polars as pl
 import sys
 import os
@@ -15,7 +14,7 @@ from src.utils.logger import setup_logger
 from src.extract.extract_customers import CustomersExtractor
 from src.extract.extract_orders import OrdersExtractor
 from src.extract.extract_order_items import OrderItemsExtractor
-import yaml
+from src.utils.config import load_config
 
 logger = setup_logger('transform_dim_customers')
 
@@ -25,13 +24,18 @@ class CustomerDimensionBuilder:
     
     def __init__(self, config_path='config/business_rules.yaml'):
         """Initialize with business rules from config"""
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
+        config = load_config(config_path)
         
         self.segmentation_rules = config['customer_segmentation']
         self.regions = config['regions']
         self.clv_params = config['clv_calculation']
         
+        # state -> region lookup, built once (first region listing a state wins)
+        self._state_to_region = {}
+        for region, states in self.regions.items():
+            for state in states:
+                self._state_to_region.setdefault(state, region)
+        
         logger.info("CustomerDimensionBuilder initialized")
         logger.info(f"  - Segmentation rules: {self.segmentation_rules}")
     
@@ -60,42 +64,33 @@ class CustomerDimensionBuilder:
             df_items = items_ext.extract()
             logger.info(f"✓ Loaded {len(df_items):,} order items")
             
-            # Step 4: Calculate order-level revenue using Polars (FAST!)
-            logger.info("Calculating order-level revenue with Polars...")
-            
-            # Convert to Polars for aggregation performance
-            df_items_pl = pl.from_pandas(df_items)
+            # Steps 4-8 run as one lazy Polars plan, collected once: the
+            # optimizer pushes the column selection into the scans and the
+            # order-level revenue table is never materialized on its own
+            estimated_lifespan = self.clv_params['estimated_lifespan_days']
             
-            # Aggregate to order level
-            order_revenue_pl = df_items_pl.group_by('order_id').agg([
+            # Step 4: Calculate order-level revenue using Polars (FAST!)
+            # Convert to Polars once (only the columns used); everything up to
+            # the final to_pandas() stays in Polars, with no round-trips
+            order_revenue_lf = pl.from_pandas(df_items[['order_id', 'item_total']]).lazy().group_by('order_id').agg(
                 pl.col('item_total').sum().alias('order_total')
-            ])
-            
-            # Convert back to Pandas for join
-            order_revenue = order_revenue_pl.to_pandas()
-            logger.info(f"✓ Calculated revenue for {len(order_revenue):,} orders")
+            )
             
             # Step 5: Join orders with revenue
-            df_orders = df_orders.merge(
-                order_revenue,
+            orders_lf = pl.from_pandas(df_orders[[
+                'customer_id', 'order_id', 'order_purchase_timestamp',
+                'order_delivered_customer_date', 'order_status'
+            ]]).lazy().join(
+                order_revenue_lf,
                 on='order_id',
                 how='left'
+            ).with_columns(
+                # Fill missing revenue with 0 (canceled orders, etc.)
+                pl.col('order_total').fill_null(0)
             )
             
-            # Fill missing revenue with 0 (canceled orders, etc.)
-            df_orders['order_total'] = df_orders['order_total'].fillna(0)
-            
-            # Step 6: Calculate customer metrics using Polars (PERFORMANCE!)
-            logger.info("Calculating customer metrics...")
-            
-            # Convert to Polars
-            df_orders_pl = pl.from_pandas(df_orders[[
-                'customer_id', 'order_id', 'order_purchase_timestamp',
-                'order_delivered_customer_date', 'order_total', 'order_status'
-            ]])
-            
-            # Calculate customer aggregations
-            customer_metrics_pl = df_orders_pl.group_by('customer_id').agg([
+            # Step 6: Calculate customer aggregations
+            customer_metrics_lf = orders_lf.group_by('customer_id').agg([
                 pl.col('order_id').count().alias('total_orders'),
                 pl.col('order_total').sum().alias('total_spent'),
                 pl.col('order_total').mean().alias('avg_order_value'),
@@ -104,81 +99,88 @@ class CustomerDimensionBuilder:
                 (pl.col('order_status') == 'delivered').sum().alias('delivered_orders')
             ])
             
-            # Convert back to Pandas
-            customer_metrics = customer_metrics_pl.to_pandas()
-            
-            logger.info(f"✓ Calculated metrics for {len(customer_metrics):,} customers")
-            
             # Step 7: Calculate days between first and last order
-            customer_metrics['days_as_customer'] = (
-                customer_metrics['last_order_date'] - customer_metrics['first_order_date']
-            ).dt.days
-            
-            # Avoid division by zero
-            customer_metrics['days_as_customer'] = customer_metrics['days_as_customer'].apply(
-                lambda x: max(x, 1)  # Minimum 1 day
+            # (minimum 1 day, avoids division by zero)
+            customer_metrics_lf = customer_metrics_lf.with_columns(
+                (pl.col('last_order_date') - pl.col('first_order_date'))
+                .dt.total_days()
+                .clip(lower_bound=1)
+                .alias('days_as_customer')
             )
             
             # Step 8: Calculate CLV (Customer Lifetime Value)
-            logger.info("Calculating Customer Lifetime Value (CLV)...")
-            
-            estimated_lifespan = self.clv_params['estimated_lifespan_days']
-            
             # Purchase frequency (annualized)
-            customer_metrics['purchase_frequency_annual'] = (
-                customer_metrics['total_orders'] / customer_metrics['days_as_customer'] * 365
+            customer_metrics_lf = customer_metrics_lf.with_columns(
+                (pl.col('total_orders') / pl.col('days_as_customer') * 365)
+                .alias('purchase_frequency_annual')
             )
             
             # CLV = Average Order Value × Purchase Frequency × Customer Lifespan
-            customer_metrics['lifetime_value'] = (
-                customer_metrics['avg_order_value'] * 
-                customer_metrics['purchase_frequency_annual'] * 
-                (estimated_lifespan / 365)
-            ).round(2)
+            customer_metrics_lf = customer_metrics_lf.with_columns(
+                (
+                    pl.col('avg_order_value') *
+                    pl.col('purchase_frequency_annual') *
+                    (estimated_lifespan / 365)
+                ).round(2).alias('lifetime_value')
+            )
+            
+            logger.info("Calculating customer metrics and CLV with Polars...")
+            customer_metrics_pl = customer_metrics_lf.collect()
+            logger.info(f"✓ Calculated metrics for {len(customer_metrics_pl):,} customers")
             
+            clv_stats = customer_metrics_pl.select(
+                pl.col('lifetime_value').mean().alias('mean'),
+                pl.col('lifetime_value').median().alias('median'),
+                pl.col('lifetime_value').max().alias('max')
+            ).row(0, named=True)
             logger.info(f"✓ Calculated CLV for all customers")
-            logger.info(f"  - Average CLV: R$ {customer_metrics['lifetime_value'].mean():.2f}")
-            logger.info(f"  - Median CLV: R$ {customer_metrics['lifetime_value'].median():.2f}")
-            logger.info(f"  - Max CLV: R$ {customer_metrics['lifetime_value'].max():.2f}")
+            logger.info(f"  - Average CLV: R$ {clv_stats['mean']:.2f}")
+            logger.info(f"  - Median CLV: R$ {clv_stats['median']:.2f}")
+            logger.info(f"  - Max CLV: R$ {clv_stats['max']:.2f}")
             
             # Step 9: Join metrics with base customer data
-            df = df_customers.merge(
-                customer_metrics,
+            df_pl = pl.from_pandas(df_customers).join(
+                customer_metrics_pl,
                 on='customer_id',
                 how='left'
             )
             
             # Handle customers with no orders (should be rare)
-            no_orders = df['total_orders'].isnull()
-            if no_orders.any():
-                logger.warning(f"⚠ {no_orders.sum()} customers with no orders")
-                df.loc[no_orders, 'total_orders'] = 0
-                df.loc[no_orders, 'total_spent'] = 0
-                df.loc[no_orders, 'lifetime_value'] = 0
+            no_orders = df_pl['total_orders'].null_count()
+            if no_orders:
+                logger.warning(f"⚠ {no_orders} customers with no orders")
+                df_pl = df_pl.with_columns(
+                    pl.col('total_orders').fill_null(0),
+                    pl.col('total_spent').fill_null(0),
+                    pl.col('lifetime_value').fill_null(0)
+                )
             
             # Step 10: Add customer region
-            df['customer_region'] = df['customer_state'].apply(self._get_region)
+            df_pl = df_pl.with_columns(self._get_region().alias('customer_region'))
             
             logger.info("✓ Mapped customers to regions")
-            region_dist = df['customer_region'].value_counts()
-            for region, count in region_dist.items():
+            for region, count in df_pl['customer_region'].value_counts(sort=True).iter_rows():
                 logger.info(f"  - {region}: {count:,} customers")
             
             # Step 11: Add customer segmentation
-            df['customer_segment'] = df.apply(self._segment_customer, axis=1)
+            df_pl = df_pl.with_columns(self._segment_customer().alias('customer_segment'))
             
             logger.info("✓ Applied customer segmentation")
-            segment_dist = df['customer_segment'].value_counts()
-            for segment, count in segment_dist.items():
+            for segment, count in df_pl['customer_segment'].value_counts(sort=True).iter_rows():
                 logger.info(f"  - {segment}: {count:,} customers")
             
             # Step 12: Create surrogate key
-            df = df.reset_index(drop=True)
-            df.insert(0, 'customer_key', df.index + 1)
+            df_pl = df_pl.with_row_index('customer_key', offset=1).with_columns(
+                pl.col('customer_key').cast(pl.Int32)
+            )
             
-            # Step 13: Add timestamps
-            df['created_at'] = pd.Timestamp.now()
-            df['updated_at'] = pd.Timestamp.now()
+            # Step 13: Add timestamps (one clock read: both columns carry the
+            # same build time)
+            now = datetime.now()
+            df_pl = df_pl.with_columns(
+                pl.lit(now).alias('created_at'),
+                pl.lit(now).alias('updated_at')
+            )
             
             # Step 14: Select and order final columns
             final_columns = [
@@ -203,8 +205,10 @@ class CustomerDimensionBuilder:
             ]
             
             # Keep only columns that exist
-            final_columns = [col for col in final_columns if col in df.columns]
-            df = df[final_columns]
+            final_columns = [col for col in final_columns if col in df_pl.columns]
+            
+            # Convert to Pandas once, at the end
+            df = df_pl.select(final_columns).to_pandas()
             
             logger.info(f"✓ Customer dimension built successfully: {len(df):,} rows")
             logger.info(f"  - Columns: {len(df.columns)}")
@@ -215,42 +219,42 @@ class CustomerDimensionBuilder:
             logger.error(f"✗ Customer dimension build failed: {e}")
             raise
     
-    def _get_region(self, state):
-        """Map state to region"""
-        if pd.isna(state):
-            return 'Unknown'
-        
-        for region, states in self.regions.items():
-            if state in states:
-                return region
-        return 'Other'
+    def _get_region(self):
+        """
+        Region of customer_state, as a Polars expression ('Unknown' if the
+        state is missing, 'Other' if no region lists it)
+        """
+        state = pl.col('customer_state').cast(pl.Utf8)
+        return (
+            pl.when(state.is_null())
+            .then(pl.lit('Unknown'))
+            .otherwise(state.replace(self._state_to_region, default='Other'))
+        )
     
-    def _segment_customer(self, row):
+    def _segment_customer(self):
         """
-        Segment customer based on business rules
+        Customer segment from the business rules, as a Polars expression
         
         Segmentation:
         - New: 1 order
         - Returning: 2-5 orders
         - VIP: >5 orders OR lifetime_value > threshold
         """
-        total_orders = row['total_orders']
-        lifetime_value = row['lifetime_value'] if pd.notna(row['lifetime_value']) else 0
+        total_orders = pl.col('total_orders')
+        lifetime_value = pl.col('lifetime_value').fill_null(0)
         
         vip_threshold = self.segmentation_rules['vip_customer_min_value']
         vip_orders = self.segmentation_rules['vip_customer_min_orders']
         returning_max = self.segmentation_rules['returning_customer_max_orders']
         
-        if total_orders == 0:
-            return 'Inactive'
-        elif total_orders >= vip_orders or lifetime_value >= vip_threshold:
-            return 'VIP'
-        elif total_orders <= 1:
-            return 'New'
-        elif total_orders <= returning_max:
-            return 'Returning'
-        else:
-            return 'Loyal'
+        # First matching branch wins, like an if/elif chain
+        return (
+            pl.when(total_orders == 0).then(pl.lit('Inactive'))
+            .when((total_orders >= vip_orders) | (lifetime_value >= vip_threshold)).then(pl.lit('VIP'))
+            .when(total_orders <= 1).then(pl.lit('New'))
+            .when(total_orders <= returning_max).then(pl.lit('Returning'))
+            .otherwise(pl.lit('Loyal'))
+        )
 
 
 # Test the builder
@@ -5,7 +5,6 @@ Uses Polars for fast date generation
 """
 
 import polars as pl
-import pandas as pd
 from datetime import datetime, timedelta
 import sys
 import os
@@ -13,18 +12,22 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from src.utils.logger import setup_logger
-import yaml
+from src.utils.config import load_config
 
 logger = setup_logger('transform_dim_date')
 
+# Month and weekday names (English, independent of the system locale)
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December']
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
 
 class DateDimensionBuilder:
     """Build Date Dimension using Polars for performance"""
     
     def __init__(self, config_path='config/business_rules.yaml'):
         """Initialize with date range from config"""
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
+        config = load_config(config_path)
         
         self.start_date = config['date_dimension']['start_date']
         self.end_date = config['date_dimension']['end_date']
@@ -45,6 +48,10 @@ class DateDimensionBuilder:
             '2018-11-02', '2018-11-15', '2018-12-25'
         ]
         
+        # Holidays as date_key integers (YYYYMMDD), matched against date_key
+        # without formatting every date as a string
+        self.holiday_keys = [int(holiday.replace('-', '')) for holiday in self.holidays]
+        
         logger.info(f"DateDimensionBuilder initialized: {self.start_date} to {self.end_date}")
     
     def build(self):
@@ -77,34 +84,33 @@ class DateDimensionBuilder:
             logger.info(f"✓ Generated {len(df):,} dates from {self.start_date} to {self.end_date}")
             
             # Add date attributes using Polars (much faster than pandas)
+            # Integer attributes use the smallest type that fits (Int8/Int16),
+            # matching the SMALLINT columns in the warehouse
             df = df.with_columns([
-                # Date key (YYYYMMDD format as integer)
-                (pl.col('full_date').dt.strftime('%Y%m%d').cast(pl.Int32)).alias('date_key'),
-                
                 # Year, Quarter, Month
-                pl.col('full_date').dt.year().alias('year'),
-                pl.col('full_date').dt.quarter().alias('quarter'),
-                pl.col('full_date').dt.month().alias('month'),
+                pl.col('full_date').dt.year().cast(pl.Int16).alias('year'),
+                pl.col('full_date').dt.quarter().cast(pl.Int8).alias('quarter'),
+                pl.col('full_date').dt.month().cast(pl.Int8).alias('month'),
                 
                 # Week
-                pl.col('full_date').dt.week().alias('week'),
+                pl.col('full_date').dt.week().cast(pl.Int8).alias('week'),
                 
                 # Day attributes
-                pl.col('full_date').dt.day().alias('day_of_month'),
-                pl.col('full_date').dt.weekday().alias('day_of_week'),  # 1=Monday, 7=Sunday
+                pl.col('full_date').dt.day().cast(pl.Int8).alias('day_of_month'),
+                pl.col('full_date').dt.weekday().cast(pl.Int8).alias('day_of_week'),  # 1=Monday, 7=Sunday
                 
                 # Boolean flags
                 (pl.col('full_date').dt.weekday() >= 6).alias('is_weekend'),
             ])
             
-            # Add month name
+            # Date key (YYYYMMDD as integer) and month/day names, derived from
+            # the integer attributes instead of formatting every date as text
             df = df.with_columns([
-                pl.col('full_date').dt.strftime('%B').alias('month_name')
-            ])
-            
-            # Add day name
-            df = df.with_columns([
-                pl.col('full_date').dt.strftime('%A').alias('day_name')
+                (pl.col('year').cast(pl.Int32) * 10000
+                 + pl.col('month').cast(pl.Int32) * 100
+                 + pl.col('day_of_month')).alias('date_key'),
+                pl.col('month').replace(dict(enumerate(MONTH_NAMES, start=1)), default=None).alias('month_name'),
+                pl.col('day_of_week').replace(dict(enumerate(DAY_NAMES, start=1)), default=None).alias('day_name')
             ])
             
             # Add fiscal year and quarter (Brazilian fiscal year = calendar year)
@@ -115,18 +121,13 @@ class DateDimensionBuilder:
             
             logger.info("✓ Added date attributes (year, quarter, month, week, day)")
             
-            # Convert to Pandas for holiday processing (easier string matching)
-            df_pandas = df.to_pandas()
-            
-            # Add holiday flag
-            df_pandas['full_date_str'] = df_pandas['full_date'].dt.strftime('%Y-%m-%d')
-            df_pandas['is_holiday'] = df_pandas['full_date_str'].isin(self.holidays)
-            df_pandas = df_pandas.drop('full_date_str', axis=1)
-            
-            logger.info(f"✓ Marked {df_pandas['is_holiday'].sum()} holidays")
+            # Add holiday flag and created_at timestamp
+            df = df.with_columns([
+                pl.col('date_key').is_in(self.holiday_keys).alias('is_holiday'),
+                pl.lit(datetime.now()).alias('created_at')
+            ])
             
-            # Add created_at timestamp
-            df_pandas['created_at'] = datetime.now()
+            logger.info(f"✓ Marked {df['is_holiday'].sum()} holidays")
             
             # Reorder columns
             column_order = [
@@ -137,15 +138,18 @@ class DateDimensionBuilder:
                 'fiscal_year', 'fiscal_quarter',
                 'created_at'
             ]
-            df_pandas = df_pandas[column_order]
+            df = df.select(column_order)
             
-            logger.info(f"✓ Date dimension built successfully: {len(df_pandas):,} rows")
+            logger.info(f"✓ Date dimension built successfully: {len(df):,} rows")
             
             # Log some statistics
-            logger.info(f"  - Date range: {df_pandas['full_date'].min()} to {df_pandas['full_date'].max()}")
-            logger.info(f"  - Weekend days: {df_pandas['is_weekend'].sum():,}")
-            logger.info(f"  - Holidays: {df_pandas['is_holiday'].sum()}")
-            logger.info(f"  - Total days: {len(df_pandas):,}")
+            logger.info(f"  - Date range: {df['full_date'].min()} to {df['full_date'].max()}")
+            logger.info(f"  - Weekend days: {df['is_weekend'].sum():,}")
+            logger.info(f"  - Holidays: {df['is_holiday'].sum()}")
+            logger.info(f"  - Total days: {len(df):,}")
+            
+            # Convert to Pandas once, at the end
+            df_pandas = df.to_pandas()
             
             return df_pandas
             
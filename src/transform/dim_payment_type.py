@@ -3,6 +3,7 @@ Create Payment Type Dimension (Lookup Table)
 Simple dimension with payment method categorization
 """
 
+import numpy as np
 import pandas as pd
 import sys
 import os
@@ -18,16 +19,17 @@ logger = setup_logger('transform_dim_payment_type')
 class PaymentTypeDimensionBuilder:
     """Build Payment Type Dimension (simple lookup)"""
     
+    # Payment type categorization (class attribute, shared by all instances)
+    payment_categories = {
+        'credit_card': 'Credit',
+        'boleto': 'Cash/Banking',
+        'debit_card': 'Debit',
+        'voucher': 'Voucher',
+        'not_defined': 'Unknown'
+    }
+    
     def __init__(self):
         """Initialize payment type dimension builder"""
-        # Payment type categorization
-        self.payment_categories = {
-            'credit_card': 'Credit',
-            'boleto': 'Cash/Banking',
-            'debit_card': 'Debit',
-            'voucher': 'Voucher',
-            'not_defined': 'Unknown'
-        }
         logger.info("PaymentTypeDimensionBuilder initialized")
     
     def build(self):
@@ -40,12 +42,15 @@ class PaymentTypeDimensionBuilder:
         try:
             logger.info("Building payment type dimension...")
             
-            # Extract payments to get distinct payment types
+            # Extract payments to get distinct payment types (only the
+            # payment_type column is read from the snapshot)
             extractor = PaymentsExtractor()
-            df_payments = extractor.extract()
+            df_payments = extractor.extract(columns=['payment_type'])
             
-            # Get unique payment types
-            unique_payment_types = df_payments['payment_type'].dropna().unique()
+            # Get unique payment types in order of first appearance (as plain
+            # strings); works for category and object columns alike (with a
+            # category column unique() only hashes the small integer codes)
+            unique_payment_types = df_payments['payment_type'].dropna().unique().tolist()
             
             logger.info(f"✓ Found {len(unique_payment_types)} unique payment types")
             
@@ -64,14 +69,18 @@ class PaymentTypeDimensionBuilder:
                 df.loc[unmapped, 'payment_category'] = 'Other'
             
             # Create surrogate key
-            df = df.reset_index(drop=True)
-            df.insert(0, 'payment_type_key', df.index + 1)
+            if not isinstance(df.index, pd.RangeIndex):
+                df = df.reset_index(drop=True)
+            df.insert(0, 'payment_type_key', np.arange(1, len(df) + 1, dtype=np.int32))
             
             # Add timestamp
             df['created_at'] = pd.Timestamp.now()
             
-            # Reorder columns
-            df = df[['payment_type_key', 'payment_type', 'payment_category', 'created_at']]
+            # Reorder columns; the label columns are categorical, so consumers
+            # group/join on integer codes
+            df = df[['payment_type_key', 'payment_type', 'payment_category', 'created_at']].astype({
+                'payment_type': 'category', 'payment_category': 'category'
+            })
             
             logger.info(f"✓ Payment type dimension built successfully: {len(df)} rows")
             logger.info(f"  - Payment types: {', '.join(df['payment_type'].tolist())}")
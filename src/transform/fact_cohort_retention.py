@@ -3,6 +3,7 @@ Build FACT_COHORT_RETENTION - Pre-calculated cohort analysis
 Shows retention rates by customer acquisition cohort
 """
 
+import logging
 import pandas as pd
 import polars as pl
 import sys
@@ -43,96 +44,65 @@ class CohortRetentionBuilder:
             df_orders = orders_ext.extract()
             logger.info(f"  ✓ Loaded {len(df_orders):,} orders")
             
-            # Step 2: Get customer first order dates from dimension
-            logger.info("Step 2/5: Getting customer cohorts...")
-            
-            df_customers_cohort = dim_customers[['customer_id', 'first_order_date']].copy()
+            # Steps 2-5 run as one lazy Polars plan, collected once: the join,
+            # month arithmetic, aggregation and cohort-size window are fused,
+            # with no pandas round-trips in between
             
-            # Create cohort month (YYYY-MM format)
-            df_customers_cohort['cohort_month'] = pd.to_datetime(
-                df_customers_cohort['first_order_date']
-            ).dt.to_period('M')
-            
-            logger.info(f"  ✓ Identified {df_customers_cohort['cohort_month'].nunique()} cohorts")
+            # Step 2: Get customer cohorts (month of the first order)
+            logger.info("Step 2/5: Getting customer cohorts...")
+            # Columns are handed to Polars one by one: selecting a sub-frame
+            # in pandas would first copy both columns into a new block
+            customers_lf = pl.DataFrame({
+                col: dim_customers[col] for col in ('customer_id', 'first_order_date')
+            }).lazy().select(
+                pl.col('customer_id'),
+                pl.col('first_order_date').cast(pl.Datetime('ns')).dt.truncate('1mo').alias('cohort_month')
+            )
             
-            # Step 3: Prepare orders data
+            # Step 3: Join orders with customer cohorts (customer_id is unique
+            # in the dimension, so this is a single hashed lookup of each
+            # order's cohort month, run inside the lazy plan; orders of
+            # customers missing from the dimension are dropped)
             logger.info("Step 3/5: Preparing order data for cohort analysis...")
-            
-            df_orders_cohort = df_orders[['customer_id', 'order_purchase_timestamp']].copy()
-            df_orders_cohort['order_month'] = pd.to_datetime(
-                df_orders_cohort['order_purchase_timestamp']
-            ).dt.to_period('M')
-            
-            # Join orders with customer cohorts
-            df_analysis = df_orders_cohort.merge(
-                df_customers_cohort,
+            analysis_lf = pl.DataFrame({
+                col: df_orders[col] for col in ('customer_id', 'order_purchase_timestamp')
+            }).lazy().join(
+                customers_lf,
                 on='customer_id',
                 how='inner'
             )
             
-            logger.info(f"  ✓ Prepared {len(df_analysis):,} order records for analysis")
-            
-            # Step 4: Calculate months since first purchase
+            # Step 4: Calculate months since first purchase as the difference of
+            # two month indices (one integer subtraction per row), grouped on
+            # as int16, then retained customers per month
             logger.info("Step 4/5: Calculating retention by cohort...")
-            
-            # Calculate months difference
-            df_analysis['months_since_first_purchase'] = (
-                (df_analysis['order_month'] - df_analysis['cohort_month']).apply(lambda x: x.n)
-            )
-            
-            # Convert periods back to dates for grouping
-            df_analysis['cohort_month_date'] = df_analysis['cohort_month'].dt.to_timestamp()
-            
-            # Use Polars for fast aggregation
-            df_analysis_pl = pl.from_pandas(df_analysis[[
-                'cohort_month_date', 'months_since_first_purchase', 'customer_id'
-            ]])
-            
-            # Group by cohort and months since first purchase
-            cohort_data_pl = df_analysis_pl.group_by([
-                'cohort_month_date', 'months_since_first_purchase'
+            cohort_lf = analysis_lf.with_columns(
+                (self._month_index('order_purchase_timestamp') - self._month_index('cohort_month'))
+                .cast(pl.Int16)
+                .alias('months_since_first_purchase')
+            ).group_by([
+                'cohort_month', 'months_since_first_purchase'
             ]).agg([
-                pl.col('customer_id').n_unique().alias('retained_customers')
-            ]).sort(['cohort_month_date', 'months_since_first_purchase'])
-            
-            cohort_data = cohort_data_pl.to_pandas()
+                pl.col('customer_id').n_unique().cast(pl.Int32).alias('retained_customers')
+            ]).sort(['cohort_month', 'months_since_first_purchase'])
             
-            logger.info(f"  ✓ Calculated retention for {len(cohort_data):,} cohort-month combinations")
-            
-            # Step 5: Calculate cohort sizes and retention rates
+            # Step 5: Cohort size (month 0 = acquisition month) and retention rate
             logger.info("Step 5/5: Calculating cohort sizes and retention rates...")
-            
-            # Get cohort sizes (month 0 = acquisition month)
-            cohort_sizes = cohort_data[
-                cohort_data['months_since_first_purchase'] == 0
-            ][['cohort_month_date', 'retained_customers']].copy()
-            cohort_sizes.columns = ['cohort_month_date', 'cohort_size']
-            
-            # Merge cohort sizes
-            cohort_data = cohort_data.merge(
-                cohort_sizes,
-                on='cohort_month_date',
-                how='left'
+            cohort_lf = cohort_lf.with_columns(
+                pl.col('retained_customers')
+                .filter(pl.col('months_since_first_purchase') == 0)
+                .first()
+                .over('cohort_month')
+                .alias('cohort_size')
+            ).with_columns(
+                # Rounded in float64, then stored as float32 (two decimals of a
+                # 0-100 rate fit easily); counts are int32, month offsets int16
+                (pl.col('retained_customers') / pl.col('cohort_size') * 100).round(2).cast(pl.Float32).alias('retention_rate')
             )
             
-            # Calculate retention rate
-            cohort_data['retention_rate'] = (
-                cohort_data['retained_customers'] / cohort_data['cohort_size'] * 100
-            ).round(2)
-            
-            # Rename for final output
-            cohort_data = cohort_data.rename(columns={
-                'cohort_month_date': 'cohort_month'
-            })
-            
-            # Create surrogate key
-            cohort_data = cohort_data.reset_index(drop=True)
-            cohort_data.insert(0, 'cohort_retention_key', cohort_data.index + 1)
-            
-            # Add created_at
-            cohort_data['created_at'] = pd.Timestamp.now()
-            
-            # Reorder columns
+            # Surrogate key, created_at and the column order are added to the
+            # plan too, so the collected frame is converted to pandas once,
+            # with no insert/reorder copies afterwards
             final_columns = [
                 'cohort_retention_key',
                 'cohort_month',
@@ -143,30 +113,37 @@ class CohortRetentionBuilder:
                 'created_at'
             ]
             
-            cohort_data = cohort_data[final_columns]
-            
-            logger.info(f"✓ FACT_COHORT_RETENTION built successfully: {len(cohort_data):,} rows")
-            
-            # Log insights
-            logger.info("\n" + "="*60)
-            logger.info("COHORT RETENTION INSIGHTS:")
-            logger.info(f"  - Total cohorts: {cohort_data['cohort_month'].nunique()}")
-            logger.info(f"  - Average cohort size: {cohort_data[cohort_data['months_since_first_purchase']==0]['cohort_size'].mean():.0f} customers")
+            cohort_data = cohort_lf.with_row_index('cohort_retention_key', offset=1).with_columns(
+                pl.col('cohort_retention_key').cast(pl.Int32),
+                pl.lit(datetime.now()).alias('created_at')
+            ).select(final_columns).collect().to_pandas()
             
-            # Month 1 retention (repeat purchase rate)
-            month_1_retention = cohort_data[
-                cohort_data['months_since_first_purchase'] == 1
-            ]['retention_rate'].mean()
-            logger.info(f"  - Average Month 1 retention: {month_1_retention:.1f}%")
+            logger.info(f"  ✓ Identified {cohort_data['cohort_month'].nunique()} cohorts")
+            logger.info(f"  ✓ Calculated retention for {len(cohort_data):,} cohort-month combinations")
             
-            # Month 3 retention
-            month_3_retention = cohort_data[
-                cohort_data['months_since_first_purchase'] == 3
-            ]['retention_rate'].mean()
-            if pd.notna(month_3_retention):
-                logger.info(f"  - Average Month 3 retention: {month_3_retention:.1f}%")
+            logger.info(f"✓ FACT_COHORT_RETENTION built successfully: {len(cohort_data):,} rows")
             
-            logger.info("="*60 + "\n")
+            # Log insights (the month filters only run when INFO is enabled)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("\n" + "="*60)
+                logger.info("COHORT RETENTION INSIGHTS:")
+                logger.info(f"  - Total cohorts: {cohort_data['cohort_month'].nunique()}")
+                logger.info(f"  - Average cohort size: {cohort_data[cohort_data['months_since_first_purchase']==0]['cohort_size'].mean():.0f} customers")
+                
+                # Month 1 retention (repeat purchase rate)
+                month_1_retention = cohort_data[
+                    cohort_data['months_since_first_purchase'] == 1
+                ]['retention_rate'].mean()
+                logger.info(f"  - Average Month 1 retention: {month_1_retention:.1f}%")
+                
+                # Month 3 retention
+                month_3_retention = cohort_data[
+                    cohort_data['months_since_first_purchase'] == 3
+                ]['retention_rate'].mean()
+                if pd.notna(month_3_retention):
+                    logger.info(f"  - Average Month 3 retention: {month_3_retention:.1f}%")
+                
+                logger.info("="*60 + "\n")
             
             return cohort_data
             
@@ -175,6 +152,12 @@ class CohortRetentionBuilder:
             import traceback
             traceback.print_exc()
             raise
+    
+    @staticmethod
+    def _month_index(column):
+        """Months since year 0 of a datetime column (year * 12 + month), as Int32"""
+        date = pl.col(column).dt
+        return date.year().cast(pl.Int32) * 12 + date.month().cast(pl.Int32)
 
 
 # Test the builder
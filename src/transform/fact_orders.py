@@ -1,12 +1,15 @@
 """
 Build FACT_ORDERS - Central Fact Table
-Uses both Polars (for aggregations) and Pandas (for complex joins)
+Aggregations, joins and delivery metrics run as one lazy Polars plan
 """
 
+import numpy as np
 import pandas as pd
 import polars as pl
+import pyarrow as pa
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
@@ -19,10 +22,51 @@ from src.extract.extract_reviews import ReviewsExtractor
 
 logger = setup_logger('transform_fact_orders')
 
+# Arrow integer types -> pandas nullable dtypes, used when converting the
+# collected fact table (nulls would otherwise widen a column to float64)
+NULLABLE_INTS = {
+    pa.int8(): pd.Int8Dtype(),
+    pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(),
+    pa.int64(): pd.Int64Dtype()
+}
+
 
 class FactOrdersBuilder:
     """Build FACT_ORDERS with all metrics and foreign keys"""
     
+    # Source label -> (extractor, scan lazily), read in parallel in step 1;
+    # items and payments are only aggregated and reviews only contribute
+    # review_score, so they are scanned as Polars LazyFrames (reading just
+    # the columns the plan uses) instead of being extracted into pandas
+    SOURCES = {
+        'Orders': (OrdersExtractor, False),
+        'Order items': (OrderItemsExtractor, True),
+        'Payments': (PaymentsExtractor, True),
+        'Reviews': (ReviewsExtractor, True)
+    }
+    
+    # Values for orders the item/payment aggregates have no row for
+    # (canceled orders without items, orders without payments)
+    JOIN_FILL_VALUES = {
+        'order_item_count': 0,
+        'order_subtotal': 0,
+        'order_freight_total': 0,
+        'order_total_value': 0,
+        'payment_value': 0,
+        'payment_installments': 1,
+        'payment_type': 'not_defined'
+    }
+    
+    # Dimension keys whose nulls are reported as unmapped rows (a missing
+    # delivery_date_key just means the order was not delivered)
+    MAPPED_KEYS = {
+        'customer_key': 'customers',
+        'product_key': 'products',
+        'payment_type_key': 'payment types',
+        'order_date_key': 'order dates'
+    }
+    
     def __init__(self):
         """Initialize fact orders builder"""
         logger.info("FactOrdersBuilder initialized")
@@ -45,29 +89,23 @@ class FactOrdersBuilder:
             
             # Step 1: Extract source data
             logger.info("Step 1/8: Extracting source data...")
-            orders_ext = OrdersExtractor()
-            df_orders = orders_ext.extract()
-            logger.info(f"  ✓ Orders: {len(df_orders):,} rows")
-            
-            items_ext = OrderItemsExtractor()
-            df_items = items_ext.extract()
-            logger.info(f"  ✓ Order items: {len(df_items):,} rows")
-            
-            payments_ext = PaymentsExtractor()
-            df_payments = payments_ext.extract()
-            logger.info(f"  ✓ Payments: {len(df_payments):,} rows")
-            
-            reviews_ext = ReviewsExtractor()
-            df_reviews = reviews_ext.extract()
-            logger.info(f"  ✓ Reviews: {len(df_reviews):,} rows")
+            # The four sources are independent, so they are read concurrently
+            # (Parquet/CSV readers release the GIL while parsing)
+            with ThreadPoolExecutor(max_workers=len(self.SOURCES)) as executor:
+                df_orders, items_lf, payments_lf, reviews_lf = executor.map(
+                    self._extract_source, self.SOURCES.items()
+                )
+            
+            # Steps 2-8 run as one lazy Polars plan, collected once: the
+            # aggregations, joins, null fills, delivery metrics and dimension
+            # key lookups are fused,
+            # with a single conversion back to pandas at the end
             
             # Step 2: Aggregate order items to order level using Polars
             logger.info("Step 2/8: Aggregating order items to order level with Polars...")
             
-            df_items_pl = pl.from_pandas(df_items)
-            
-            order_items_agg_pl = df_items_pl.group_by('order_id').agg([
-                pl.col('order_item_id').count().alias('order_item_count'),
+            order_items_agg_lf = items_lf.group_by('order_id').agg([
+                pl.col('order_item_id').count().cast(pl.Int16).alias('order_item_count'),
                 pl.col('price').sum().alias('order_subtotal'),
                 pl.col('freight_value').sum().alias('order_freight_total'),
                 pl.col('item_total').sum().alias('order_total_value'),
@@ -77,170 +115,139 @@ class FactOrdersBuilder:
                 pl.col('seller_id').first().alias('seller_id')
             ])
             
-            order_items_agg = order_items_agg_pl.to_pandas()
-            logger.info(f"  ✓ Aggregated {len(order_items_agg):,} orders")
-            
             # Step 3: Aggregate payments to order level using Polars
             logger.info("Step 3/8: Aggregating payments to order level with Polars...")
             
-            df_payments_pl = pl.from_pandas(df_payments)
-            
-            order_payments_agg_pl = df_payments_pl.group_by('order_id').agg([
+            order_payments_agg_lf = payments_lf.group_by('order_id').agg([
                 pl.col('payment_value').sum().alias('payment_value'),
                 # Get primary payment type (most common for this order)
-                pl.col('payment_type').first().alias('payment_type'),
+                pl.col('payment_type').first().cast(pl.Utf8).alias('payment_type'),
                 # Max installments
                 pl.col('payment_installments').max().alias('payment_installments')
             ])
             
-            order_payments_agg = order_payments_agg_pl.to_pandas()
-            logger.info(f"  ✓ Aggregated {len(order_payments_agg):,} payment records")
-            
             # Step 4: Join orders with aggregated items
             logger.info("Step 4/8: Joining orders with order items...")
             
-            df_fact = df_orders.merge(
-                order_items_agg,
+            fact_lf = pl.from_pandas(df_orders).lazy().join(
+                order_items_agg_lf,
                 on='order_id',
                 how='left'
             )
             
-            # Fill missing values for orders without items (canceled, etc.)
-            df_fact['order_item_count'] = df_fact['order_item_count'].fillna(0)
-            df_fact['order_subtotal'] = df_fact['order_subtotal'].fillna(0)
-            df_fact['order_freight_total'] = df_fact['order_freight_total'].fillna(0)
-            df_fact['order_total_value'] = df_fact['order_total_value'].fillna(0)
-            
-            logger.info(f"  ✓ After items join: {len(df_fact):,} rows")
-            
-            # Step 5: Join with payments
+            # Step 5: Join with payments, then fill the gaps of both joins in
+            # one pass (see JOIN_FILL_VALUES)
             logger.info("Step 5/8: Joining with payments...")
             
-            df_fact = df_fact.merge(
-                order_payments_agg,
+            fact_lf = fact_lf.join(
+                order_payments_agg_lf,
                 on='order_id',
                 how='left'
+            ).with_columns(
+                pl.col(col).fill_null(value) for col, value in self.JOIN_FILL_VALUES.items()
             )
             
-            # Fill missing payment values
-            df_fact['payment_value'] = df_fact['payment_value'].fillna(0)
-            df_fact['payment_installments'] = df_fact['payment_installments'].fillna(1)
-            df_fact['payment_type'] = df_fact['payment_type'].fillna('not_defined')
-            
-            logger.info(f"  ✓ After payments join: {len(df_fact):,} rows")
-            
             # Step 6: Join with reviews (optional - not all orders have reviews)
             logger.info("Step 6/8: Joining with reviews...")
             
-            df_reviews_subset = df_reviews[['order_id', 'review_score']].copy()
-            
-            df_fact = df_fact.merge(
-                df_reviews_subset,
+            fact_lf = fact_lf.join(
+                # Only these two columns are read from the reviews snapshot
+                reviews_lf.select('order_id', 'review_score'),
                 on='order_id',
                 how='left'
+            ).with_columns(
+                pl.col('review_score').is_not_null().alias('has_review')
             )
             
-            # Create has_review flag
-            df_fact['has_review'] = df_fact['review_score'].notna()
-            
-            reviews_count = df_fact['has_review'].sum()
-            logger.info(f"  ✓ {reviews_count:,} orders have reviews ({reviews_count/len(df_fact)*100:.1f}%)")
-            
-            # Step 7: Calculate delivery metrics
+            # Step 7: Calculate delivery metrics (non-delivered orders get 0
+            # days and are never late)
             logger.info("Step 7/8: Calculating delivery metrics...")
             
-            # Delivery days (from purchase to actual delivery)
-            df_fact['delivery_days'] = (
-                df_fact['order_delivered_customer_date'] - 
-                df_fact['order_purchase_timestamp']
-            ).dt.days
-            
-            # Estimated delivery days (from purchase to estimated delivery)
-            df_fact['estimated_delivery_days'] = (
-                df_fact['order_estimated_delivery_date'] - 
-                df_fact['order_purchase_timestamp']
-            ).dt.days
-            
-            # Delivery delay (negative = early, positive = late)
-            df_fact['delivery_delay_days'] = (
-                df_fact['order_delivered_customer_date'] - 
-                df_fact['order_estimated_delivery_date']
-            ).dt.days
-            
-            # Boolean flags
-            df_fact['is_late_delivery'] = df_fact['delivery_delay_days'] > 0
-            df_fact['is_completed_order'] = df_fact['order_status'] == 'delivered'
-            
-            # Fill NaN for non-delivered orders
-            df_fact['delivery_days'] = df_fact['delivery_days'].fillna(0)
-            df_fact['delivery_delay_days'] = df_fact['delivery_delay_days'].fillna(0)
-            df_fact['is_late_delivery'] = df_fact['is_late_delivery'].fillna(False)
-            
-            logger.info(f"  ✓ Calculated delivery metrics")
-            logger.info(f"    - Completed orders: {df_fact['is_completed_order'].sum():,}")
-            logger.info(f"    - Late deliveries: {df_fact['is_late_delivery'].sum():,}")
-            logger.info(f"    - Average delivery time: {df_fact[df_fact['delivery_days'] > 0]['delivery_days'].mean():.1f} days")
+            delivered = pl.col('order_delivered_customer_date')
+            purchased = pl.col('order_purchase_timestamp')
+            estimated = pl.col('order_estimated_delivery_date')
+            delivery_delay_days = self._days_between(delivered, estimated)
+            fact_lf = fact_lf.with_columns(
+                # Delivery days (from purchase to actual delivery)
+                self._days_between(delivered, purchased).fill_null(0).alias('delivery_days'),
+                # Estimated delivery days (from purchase to estimated delivery)
+                self._days_between(estimated, purchased).alias('estimated_delivery_days'),
+                # Delivery delay (negative = early, positive = late)
+                delivery_delay_days.fill_null(0).alias('delivery_delay_days'),
+                # Boolean flags
+                (delivery_delay_days > 0).fill_null(False).alias('is_late_delivery'),
+                (pl.col('order_status') == 'delivered').fill_null(False).alias('is_completed_order')
+            )
             
             # Step 8: Add foreign keys to dimension tables
             logger.info("Step 8/8: Adding foreign keys to dimensions...")
             
-            # Create lookup dictionaries for fast FK mapping
-            customer_lookup = dict(zip(
-                dim_customers['customer_id'],
-                dim_customers['customer_key']
-            ))
-            
-            product_lookup = dict(zip(
-                dim_products['product_id'],
-                dim_products['product_key']
-            ))
-            
-            payment_type_lookup = dict(zip(
-                dim_payment_type['payment_type'],
-                dim_payment_type['payment_type_key']
-            ))
-            
-            # Create date lookup (date_key is YYYYMMDD integer)
-            dim_date['date_str'] = dim_date['full_date'].dt.strftime('%Y%m%d').astype(int)
-            date_lookup = dict(zip(
-                dim_date['full_date'].dt.date,
-                dim_date['date_key']
-            ))
-            
-            # Map customer_key
-            df_fact['customer_key'] = df_fact['customer_id'].map(customer_lookup)
-            missing_customers = df_fact['customer_key'].isnull().sum()
-            if missing_customers > 0:
-                logger.warning(f"  ⚠ {missing_customers} orders with unmapped customers")
-            
-            # Map product_key (for primary product)
-            df_fact['product_key'] = df_fact['primary_product_id'].map(product_lookup)
-            missing_products = df_fact['product_key'].isnull().sum()
-            if missing_products > 0:
-                logger.warning(f"  ⚠ {missing_products} orders with unmapped products")
-            
-            # Map payment_type_key
-            df_fact['payment_type_key'] = df_fact['payment_type'].map(payment_type_lookup)
-            missing_payment_types = df_fact['payment_type_key'].isnull().sum()
-            if missing_payment_types > 0:
-                logger.warning(f"  ⚠ {missing_payment_types} orders with unmapped payment types")
-            
-            # Map order_date_key
-            df_fact['order_date'] = df_fact['order_purchase_timestamp'].dt.date
-            df_fact['order_date_key'] = df_fact['order_date'].map(date_lookup)
-            
-            # Map delivery_date_key (might be null for non-delivered orders)
-            df_fact['delivery_date'] = df_fact['order_delivered_customer_date'].dt.date
-            df_fact['delivery_date_key'] = df_fact['delivery_date'].map(date_lookup)
+            # Each dimension is joined on its business key (a hash join inside
+            # the plan); unmatched rows get a null key
+            fact_lf = fact_lf.join(
+                self._key_lookup(dim_customers, 'customer_id', 'customer_key'),
+                on='customer_id',
+                how='left'
+            ).join(
+                # product_key is for the order's primary product
+                self._key_lookup(dim_products, 'product_id', 'product_key'),
+                left_on='primary_product_id',
+                right_on='product_id',
+                how='left'
+            ).join(
+                self._key_lookup(dim_payment_type, 'payment_type', 'payment_type_key'),
+                on='payment_type',
+                how='left'
+            )
+            
+            # Date keys are computed, not looked up: date_key is the YYYYMMDD
+            # integer of the date, and dim_date covers every day between its
+            # first and last date. Dates outside that range (and missing
+            # delivery dates of non-delivered orders) get a null key
+            calendar = dim_date['full_date'].dt.date
+            first_date, last_date = calendar.min(), calendar.max()
+            fact_lf = fact_lf.with_columns(
+                self._date_key(purchased, first_date, last_date).alias('order_date_key'),
+                self._date_key(delivered, first_date, last_date).alias('delivery_date_key')
+            )
+            
+            fact = fact_lf.collect()
+            
+            # Every logged metric comes from one Polars reduction over the
+            # collected table (parallel column scans, no pandas passes)
+            metrics = self._metrics(fact)
+            
+            # Integer columns keep their narrow widths in pandas: nullable
+            # ones (keys, review_score) become Int* instead of float64
+            df_fact = fact.to_arrow().to_pandas(types_mapper=NULLABLE_INTS.get)
+            del fact
+            
+            n_rows = metrics['rows']
+            logger.info(f"  ✓ Joined orders with items, payments and reviews: {n_rows:,} rows")
+            logger.info(f"  ✓ {metrics['reviewed']:,} orders have reviews ({metrics['reviewed']/n_rows*100:.1f}%)")
+            logger.info(f"  ✓ Calculated delivery metrics")
+            logger.info(f"    - Completed orders: {metrics['completed']:,}")
+            logger.info(f"    - Late deliveries: {metrics['late']:,}")
+            logger.info(f"    - Average delivery time: {metrics['avg_delivery_days']:.1f} days")
+            
+            for key, name in self.MAPPED_KEYS.items():
+                missing = metrics[f'{key}_nulls']
+                if missing > 0:
+                    logger.warning(f"  ⚠ {missing} orders with unmapped {name}")
             
             logger.info(f"  ✓ Mapped all foreign keys")
             
             # Create surrogate key (order_key)
-            df_fact = df_fact.reset_index(drop=True)
-            df_fact.insert(0, 'order_key', df_fact.index + 1)
+            # Keys are int32 (ample for every table); the index is only
+            # rebuilt when earlier filters left gaps in it
+            if not isinstance(df_fact.index, pd.RangeIndex):
+                df_fact = df_fact.reset_index(drop=True)
+            df_fact.insert(0, 'order_key', np.arange(1, len(df_fact) + 1, dtype=np.int32))
             
             # Add created_at timestamp
-            df_fact['created_at'] = pd.Timestamp.now()
+            # Filled straight into a datetime64 array (no scalar broadcast
+            # through pandas' column setter)
+            df_fact['created_at'] = np.full(len(df_fact), pd.Timestamp.now().to_datetime64())
             
             # Step 9: Select and order final columns
             logger.info("Finalizing fact table structure...")
@@ -297,13 +304,13 @@ class FactOrdersBuilder:
             # Log some business metrics
             logger.info("\n" + "="*60)
             logger.info("FACT_ORDERS BUSINESS METRICS:")
-            logger.info(f"  - Total orders: {len(df_fact):,}")
-            logger.info(f"  - Total revenue: R$ {df_fact['order_total_value'].sum():,.2f}")
-            logger.info(f"  - Average order value: R$ {df_fact['order_total_value'].mean():.2f}")
-            logger.info(f"  - Completed orders: {df_fact['is_completed_order'].sum():,} ({df_fact['is_completed_order'].sum()/len(df_fact)*100:.1f}%)")
-            logger.info(f"  - Late deliveries: {df_fact['is_late_delivery'].sum():,} ({df_fact['is_late_delivery'].sum()/len(df_fact)*100:.1f}%)")
-            logger.info(f"  - Orders with reviews: {df_fact['has_review'].sum():,} ({df_fact['has_review'].sum()/len(df_fact)*100:.1f}%)")
-            logger.info(f"  - Average review score: {df_fact['review_score'].mean():.2f}/5.0")
+            logger.info(f"  - Total orders: {n_rows:,}")
+            logger.info(f"  - Total revenue: R$ {metrics['revenue']:,.2f}")
+            logger.info(f"  - Average order value: R$ {metrics['avg_order_value']:.2f}")
+            logger.info(f"  - Completed orders: {metrics['completed']:,} ({metrics['completed']/n_rows*100:.1f}%)")
+            logger.info(f"  - Late deliveries: {metrics['late']:,} ({metrics['late']/n_rows*100:.1f}%)")
+            logger.info(f"  - Orders with reviews: {metrics['reviewed']:,} ({metrics['reviewed']/n_rows*100:.1f}%)")
+            logger.info(f"  - Average review score: {metrics['avg_review_score']:.2f}/5.0")
             logger.info("="*60 + "\n")
             
             return df_fact
@@ -313,6 +320,73 @@ class FactOrdersBuilder:
             import traceback
             traceback.print_exc()
             raise
+    
+    @staticmethod
+    def _extract_source(source):
+        """Extract (or lazily scan) one SOURCES entry and log its size"""
+        label, (extractor, lazy) = source
+        if lazy:
+            lf = extractor().scan()
+            logger.info(f"  ✓ {label}: scanned")
+            return lf
+        df = extractor().extract()
+        logger.info(f"  ✓ {label}: {len(df):,} rows")
+        return df
+    
+    @classmethod
+    def _metrics(cls, fact):
+        """
+        Row count, revenue, order/delivery/review counts and averages and
+        unmapped key counts ('<key>_nulls') of the collected fact table, in
+        a single select (averages of nothing are NaN)
+        """
+        nan = float('nan')
+        delivery_days = pl.col('delivery_days')
+        return fact.select(
+            pl.len().alias('rows'),
+            pl.col('order_total_value').cast(pl.Float64).sum().alias('revenue'),
+            pl.col('order_total_value').cast(pl.Float64).mean().fill_null(nan).alias('avg_order_value'),
+            pl.col('is_completed_order').sum().alias('completed'),
+            pl.col('is_late_delivery').sum().alias('late'),
+            pl.col('has_review').sum().alias('reviewed'),
+            pl.col('review_score').mean().fill_null(nan).alias('avg_review_score'),
+            delivery_days.filter(delivery_days > 0).mean().fill_null(nan).alias('avg_delivery_days'),
+            # Arrow keeps null counts with each column, so these are free
+            *[pl.col(key).null_count().alias(f'{key}_nulls') for key in cls.MAPPED_KEYS]
+        ).row(0, named=True)
+    
+    @staticmethod
+    def _key_lookup(dim, business_key, surrogate_key):
+        """
+        Business key -> surrogate key pairs of a dimension as a LazyFrame to
+        join on (category business keys are joined as strings)
+        """
+        return pl.DataFrame({
+            business_key: dim[business_key],
+            surrogate_key: dim[surrogate_key]
+        }).lazy().with_columns(pl.col(business_key).cast(pl.Utf8))
+    
+    @staticmethod
+    def _date_key(timestamp, first_date, last_date):
+        """YYYYMMDD date_key of a datetime expression as Int32, null outside [first_date, last_date]"""
+        # Cast to ns first: on s/ms/us columns from pandas, Polars 0.20 also
+        # decodes the NaT placeholder behind each null and panics on it
+        timestamp = timestamp.cast(pl.Datetime('ns'))
+        date = timestamp.dt.date()
+        key = (
+            timestamp.dt.year().cast(pl.Int32) * 10000
+            + timestamp.dt.month().cast(pl.Int32) * 100
+            + timestamp.dt.day().cast(pl.Int32)
+        )
+        return pl.when(date.is_between(first_date, last_date)).then(key)
+    
+    @staticmethod
+    def _days_between(end, start):
+        """
+        Whole days from start to end as Int16, floored like pandas'
+        Timedelta.days (Polars' dt.total_days() truncates towards zero instead)
+        """
+        return ((end - start).dt.total_milliseconds() // 86_400_000).cast(pl.Int16)
 
 
 # Test the builder
@@ -377,3 +451,16 @@ if __name__ == "__main__":
     print(f"  - product_key nulls: {df_fact['product_key'].isnull().sum()}")
     print(f"  - payment_type_key nulls: {df_fact['payment_type_key'].isnull().sum()}")
     print(f"  - order_date_key nulls: {df_fact['order_date_key'].isnull().sum()}")
+    
+    # Undelivered orders have no delivery date, so no delivery_date_key
+    undelivered = df_fact['order_delivered_customer_date'].isna()
+    assert df_fact.loc[undelivered, 'delivery_date_key'].isna().all()
+    print(f"  - delivery_date_key nulls: {undelivered.sum()} (undelivered orders)")
+    
+    # Null ms-resolution timestamps (as the extract produces) get a null key
+    timestamps = pd.Series(pd.to_datetime(['2017-01-02 03:04:05', None])).astype('datetime64[ms]')
+    date_keys = pl.from_pandas(pd.DataFrame({'ts': timestamps})).select(
+        FactOrdersBuilder._date_key(pl.col('ts'), datetime(2017, 1, 1).date(), datetime(2017, 12, 31).date())
+    ).to_series().to_list()
+    assert date_keys == [20170102, None], date_keys
+    print("  ✓ Null delivery dates map to null date keys")
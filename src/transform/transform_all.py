@@ -5,13 +5,19 @@ Demonstrates production-level ETL orchestration
 """
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import inspect
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from src.utils.logger import setup_logger
+from src.utils.config import load_config
+from src.utils import parquet_cache
 
 # Import all dimension builders
 from src.transform.dim_date import DateDimensionBuilder
@@ -32,42 +38,73 @@ class TransformOrchestrator:
     Executes transforms in dependency order
     """
     
-    def __init__(self):
+    # Dimension tables, in the order they are summarized and saved
+    DIMENSIONS = ['dim_date', 'dim_products', 'dim_payment_type', 'dim_customers']
+    
+    # Sources (file_paths.yaml data_paths keys) each dimension is built from;
+    # a cached dimension is reused until one of them, a config file or the
+    # builder's module changes
+    DIMENSION_SOURCES = {
+        'dim_date': [],
+        'dim_products': ['products'],
+        'dim_payment_type': ['payments'],
+        'dim_customers': ['customers', 'orders', 'order_items']
+    }
+    CONFIG_FILES = ['config/file_paths.yaml', 'config/business_rules.yaml']
+    
+    # Audit columns stamped at build time, re-stamped when a dimension comes from cache
+    TIMESTAMP_COLUMNS = ['created_at', 'updated_at']
+    
+    def __init__(self, config_path='config/file_paths.yaml'):
         """Initialize orchestrator"""
         self.start_time = None
         self.dimensions = {}
         self.facts = {}
+        config = load_config(config_path)
+        self.data_paths = config['data_paths']
+        self.cache_dir = self.data_paths.get('cache_dir', './data/cache/')
+        self.use_cache = True
         logger.info("TransformOrchestrator initialized")
     
-    def run_all(self):
+    def run_all(self, use_cache=True):
         """
         Execute all transformations in correct order
         
+        Args:
+            use_cache: Reuse dimensions cached by an earlier run while their
+                sources and config are unchanged; False rebuilds them all
+        
         Returns:
             dict: Dictionary containing all dimension and fact tables
         """
         try:
             self.start_time = datetime.now()
+            self.use_cache = use_cache
             
             logger.info("\n" + "="*80)
             logger.info("STARTING COMPLETE TRANSFORMATION PIPELINE")
             logger.info("="*80 + "\n")
             
-            # Phase 1: Build Dimensions (no dependencies)
-            logger.info("PHASE 1: Building Dimension Tables")
+            # Phases 1-2: Build all dimensions concurrently. The static
+            # dimensions have no dependencies and the customer dimension only
+            # needs the source orders (for CLV), so none waits on another
+            logger.info("PHASES 1-2: Building Dimension Tables (in parallel)")
             logger.info("-" * 80)
             
-            self._build_dim_date()
-            self._build_dim_products()
-            self._build_dim_payment_type()
+            builds = [
+                self._build_dim_date,
+                self._build_dim_products,
+                self._build_dim_payment_type,
+                self._build_dim_customers
+            ]
+            with ThreadPoolExecutor(max_workers=len(builds)) as executor:
+                futures = [executor.submit(build) for build in builds]
+                # result() re-raises the exception of a failed build
+                for future in futures:
+                    future.result()
             
-            logger.info("\n")
-            
-            # Phase 2: Build Customer Dimension (depends on orders for CLV)
-            logger.info("PHASE 2: Building Customer Dimension (with CLV)")
-            logger.info("-" * 80)
-            
-            self._build_dim_customers()
+            # Builds finish in any order: keep the dimensions in build order
+            self.dimensions = {name: self.dimensions[name] for name in self.DIMENSIONS}
             
             logger.info("\n")
             
@@ -100,31 +137,62 @@ class TransformOrchestrator:
     def _build_dim_date(self):
         """Build date dimension"""
         logger.info("[1/6] Building DIM_DATE...")
-        builder = DateDimensionBuilder()
-        self.dimensions['dim_date'] = builder.build()
+        self.dimensions['dim_date'] = self._cached_dimension('dim_date', DateDimensionBuilder)
         logger.info(f"  ✓ DIM_DATE: {len(self.dimensions['dim_date']):,} rows\n")
     
     def _build_dim_products(self):
         """Build product dimension"""
         logger.info("[2/6] Building DIM_PRODUCTS...")
-        builder = ProductDimensionBuilder()
-        self.dimensions['dim_products'] = builder.build()
+        self.dimensions['dim_products'] = self._cached_dimension('dim_products', ProductDimensionBuilder)
         logger.info(f"  ✓ DIM_PRODUCTS: {len(self.dimensions['dim_products']):,} rows\n")
     
     def _build_dim_payment_type(self):
         """Build payment type dimension"""
         logger.info("[3/6] Building DIM_PAYMENT_TYPE...")
-        builder = PaymentTypeDimensionBuilder()
-        self.dimensions['dim_payment_type'] = builder.build()
+        self.dimensions['dim_payment_type'] = self._cached_dimension('dim_payment_type', PaymentTypeDimensionBuilder)
         logger.info(f"  ✓ DIM_PAYMENT_TYPE: {len(self.dimensions['dim_payment_type'])} rows\n")
     
     def _build_dim_customers(self):
         """Build customer dimension (with CLV)"""
         logger.info("[4/6] Building DIM_CUSTOMERS (with CLV calculation)...")
-        builder = CustomerDimensionBuilder()
-        self.dimensions['dim_customers'] = builder.build()
+        self.dimensions['dim_customers'] = self._cached_dimension('dim_customers', CustomerDimensionBuilder)
         logger.info(f"  ✓ DIM_CUSTOMERS: {len(self.dimensions['dim_customers']):,} rows\n")
     
+    def _cached_dimension(self, name, builder_class):
+        """
+        Build a dimension, or load it from the Parquet snapshot of an earlier
+        run built from the same sources, config and builder code
+        """
+        if not self.use_cache:
+            return builder_class().build()
+        
+        # The builder's source file is part of the key, so a logic change
+        # invalidates the snapshot without a hand-kept version number
+        files = [
+            *self.CONFIG_FILES,
+            *[self.data_paths[source] for source in self.DIMENSION_SOURCES[name]],
+            inspect.getsourcefile(builder_class)
+        ]
+        cache_key = parquet_cache.make_key(name, [parquet_cache.file_signature(path) for path in files])
+        cache_path = os.path.join(self.cache_dir, f"{name}.parquet")
+        
+        if parquet_cache.is_valid(cache_path, cache_key):
+            logger.info(f"  ✓ Loaded {name} from cache {cache_path}")
+            return self._restamp(parquet_cache.read(cache_path))
+        
+        df = builder_class().build()
+        parquet_cache.write(df, cache_path, cache_key)
+        return df
+    
+    @classmethod
+    def _restamp(cls, df):
+        """Set the audit timestamps of a cached dimension to now (same dtype)"""
+        now = pd.Timestamp.now()
+        return df.assign(**{
+            col: pd.Series(now, index=df.index, dtype=df[col].dtype)
+            for col in cls.TIMESTAMP_COLUMNS if col in df.columns
+        })
+    
     def _build_fact_orders(self):
         """Build fact orders"""
         logger.info("[5/6] Building FACT_ORDERS...")
@@ -177,32 +245,38 @@ class TransformOrchestrator:
         
         logger.info("\n" + "="*80 + "\n")
     
-    def save_to_csv(self, output_dir='data/staging'):
+    def save_to_staging(self, output_dir='data/staging', file_format='csv'):
         """
-        Save all transformed tables to CSV (for inspection before loading to DB)
+        Save all transformed tables to the staging directory
         
         Args:
-            output_dir: Directory to save CSV files
+            output_dir: Directory to save the files to
+            file_format: 'csv' (read by the load phase) or 'parquet' (columnar,
+                zstd-compressed and typed; much faster to write and read for
+                inspection or other tools, but not read by the loaders)
         """
-        import os
+        if file_format not in ('csv', 'parquet'):
+            raise ValueError(f"Unsupported staging format: {file_format}")
         
         os.makedirs(output_dir, exist_ok=True)
         
-        logger.info(f"Saving transformed tables to {output_dir}...")
+        logger.info(f"Saving transformed tables to {output_dir} as {file_format}...")
         
-        # Save dimensions
-        for name, df in self.dimensions.items():
-            filepath = os.path.join(output_dir, f"{name}.csv")
-            df.to_csv(filepath, index=False)
-            logger.info(f"  ✓ Saved {name}.csv ({len(df):,} rows)")
-        
-        # Save facts
-        for name, df in self.facts.items():
-            filepath = os.path.join(output_dir, f"{name}.csv")
-            df.to_csv(filepath, index=False)
-            logger.info(f"  ✓ Saved {name}.csv ({len(df):,} rows)")
+        # Dimensions first, then facts
+        for name, df in {**self.dimensions, **self.facts}.items():
+            filename = f"{name}.{file_format}"
+            filepath = os.path.join(output_dir, filename)
+            if file_format == 'parquet':
+                pq.write_table(pa.Table.from_pandas(df, preserve_index=False), filepath, compression='zstd')
+            else:
+                df.to_csv(filepath, index=False)
+            logger.info(f"  ✓ Saved {filename} ({len(df):,} rows)")
         
         logger.info(f"\n✓ All tables saved to {output_dir}/")
+    
+    def save_to_csv(self, output_dir='data/staging'):
+        """Save all transformed tables to CSV (the format the loaders read)"""
+        self.save_to_staging(output_dir, file_format='csv')
 
 
 # Main execution
@@ -0,0 +1,111 @@
+"""
+Column statistics helpers for extract-phase validation logging
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+def top_k(series, k=5):
+    """
+    Most frequent values of a column, without sorting every distinct value
+    
+    Args:
+        series: Column to count (category columns are counted from their codes)
+        k: Number of values to return, None for all of them
+    
+    Returns:
+        dict: {value: count} ordered by count, descending (nulls ignored)
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # One bincount over the integer codes, no hashing of strings
+        codes = series.cat.codes.to_numpy()
+        counts = np.bincount(codes[codes >= 0], minlength=len(series.cat.categories))
+        values = series.cat.categories.to_numpy()
+        present = counts > 0
+        values, counts = values[present], counts[present]
+    else:
+        values, counts = np.unique(series.dropna().to_numpy(), return_counts=True)
+    
+    if k is not None and k < len(counts):
+        # O(U) partial selection of the top k, then sort just those
+        idx = np.argpartition(-counts, k - 1)[:k]
+    else:
+        idx = np.arange(len(counts))
+    idx = idx[np.argsort(-counts[idx], kind='stable')]
+    
+    return dict(zip(values[idx].tolist(), counts[idx].tolist()))
+
+
+def count_distinct(series, dropna=True):
+    """
+    Number of distinct values in a column, in one Arrow hash pass
+    
+    Args:
+        series: Column to count
+        dropna: Ignore nulls (like nunique()); False counts null as one value
+    
+    Returns:
+        int: Distinct value count
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Count used category codes, no hashing at all
+        codes = series.cat.codes.to_numpy()
+        n_distinct = np.count_nonzero(np.bincount(codes[codes >= 0], minlength=len(series.cat.categories)))
+        if not dropna and (codes < 0).any():
+            n_distinct += 1
+        return int(n_distinct)
+    
+    array = pa.array(series, from_pandas=True)
+    return pc.count_distinct(array, mode='only_valid' if dropna else 'all').as_py()
+
+
+def count_duplicates(series):
+    """
+    Rows repeating an earlier value, same result as duplicated().sum()
+    but without materializing the boolean mask
+    
+    Returns:
+        tuple: (duplicate count, distinct value count incl. null)
+    """
+    n_distinct = count_distinct(series, dropna=False)
+    return len(series) - n_distinct, n_distinct
+
+
+def merge_distinct(series, seen=None):
+    """
+    Distinct non-null values of a column merged into those already seen,
+    hashed by Arrow instead of a Python set of objects
+    
+    Args:
+        series: Column (or chunk of a column) to add
+        seen: Arrow array returned by a previous call, or None
+    
+    Returns:
+        pyarrow.Array: Distinct non-null values of seen + series
+    """
+    values = pc.unique(pa.array(series, from_pandas=True).drop_null())
+    if seen is None:
+        return values
+    return pc.unique(pa.concat_arrays([seen, values.cast(seen.type)]))
+
+
+def min_max_mean(values):
+    """
+    Min, max and mean of the non-null entries of a NumPy array
+    Nulls are filtered out once, instead of np.nanmin/nanmax/nanmean
+    each re-masking the whole array
+    
+    Args:
+        values: NumPy array (NaN = missing for float arrays)
+    
+    Returns:
+        tuple: (min, max, mean), all NaN if there are no values
+    """
+    if values.dtype.kind == 'f':
+        values = values[~np.isnan(values)]
+    if values.size == 0:
+        return np.nan, np.nan, np.nan
+    return values.min(), values.max(), values.mean(dtype=np.float64)
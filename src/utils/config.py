@@ -0,0 +1,34 @@
+"""
+YAML configuration loader
+Parsed configs are cached per file, so building many extractors/builders
+only parses each YAML file once (until the file changes on disk)
+"""
+
+import os
+from functools import lru_cache
+
+import yaml
+
+# libyaml's C loader is much faster than the pure-Python one when available
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+@lru_cache(maxsize=8)
+def _load(path, mtime):
+    """Parse a YAML file (mtime is part of the cache key only)"""
+    with open(path, 'r') as f:
+        return yaml.load(f, Loader=SafeLoader)
+
+
+def load_config(config_path):
+    """
+    Load a YAML config file, reusing the cached result if unchanged
+    
+    Args:
+        config_path: Path to the YAML file
+    
+    Returns:
+        dict: Parsed configuration (shared between callers - do not modify)
+    """
+    path = os.path.abspath(config_path)
+    return _load(path, os.path.getmtime(path))
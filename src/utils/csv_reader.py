@@ -0,0 +1,169 @@
+"""
+Fast CSV reader for source extracts
+Uses PyArrow's multi-threaded C++ parser instead of pandas' default reader
+Parsed tables are kept per process, so a source file read by several
+transform stages (orders, order items, payments) is only parsed once
+"""
+
+import os
+from functools import lru_cache
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+# Default timestamp format (Olist: 'YYYY-MM-DD HH:MM:SS'), see timestamp_format in config
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Large read blocks keep every parser thread busy on multi-MB files
+BLOCK_SIZE = 64 << 20
+
+# dtype names used in the source_schemas config → Arrow column types
+ARROW_TYPES = {
+    'string': pa.string(),
+    'category': pa.dictionary(pa.int32(), pa.string()),
+    'int8': pa.int8(),
+    'int16': pa.int16(),
+    'int32': pa.int32(),
+    'int64': pa.int64(),
+    'float32': pa.float32(),
+    'float64': pa.float64(),
+    'bool': pa.bool_(),
+    # pandas nullable names: Arrow columns are always nullable
+    'Int8': pa.int8(),
+    'Int16': pa.int16(),
+    'Int32': pa.int32(),
+    'Int64': pa.int64(),
+    'boolean': pa.bool_(),
+    'timestamp': pa.timestamp('s')
+}
+
+
+def _convert_options(dtypes, timestamp_format):
+    """Arrow conversion options for a {column: dtype name} schema"""
+    return pacsv.ConvertOptions(
+        column_types={col: ARROW_TYPES[dtype] for col, dtype in dtypes.items()},
+        # An empty list means every column is read
+        include_columns=list(dtypes),
+        timestamp_parsers=[timestamp_format],
+        # Match pandas: empty strings are missing values, not ''
+        strings_can_be_null=True
+    )
+
+
+@lru_cache(maxsize=8)
+def _read_table(path, mtime, columns, newlines_in_values, timestamp_format):
+    """Parse a CSV into an Arrow table (mtime is part of the cache key only)"""
+    # Memory-mapped input: Arrow reads pages straight from the OS cache
+    # instead of going through small buffered read() calls
+    with pa.memory_map(path, 'r') as source:
+        return pacsv.read_csv(
+            source,
+            read_options=pacsv.ReadOptions(use_threads=True, block_size=BLOCK_SIZE),
+            parse_options=pacsv.ParseOptions(newlines_in_values=newlines_in_values),
+            convert_options=_convert_options(dict(columns), timestamp_format)
+        )
+
+
+def read_table(file_path, dtypes=None, newlines_in_values=False, timestamp_format=TIMESTAMP_FORMAT,
+               cache=True):
+    """
+    Read a CSV file into an Arrow table (cached per process, see read_csv)
+    
+    Args:
+        cache: Keep the table for later callers; pass False for files read
+            only once (e.g. staging files for a load) so the memory is freed
+    
+    Returns:
+        pyarrow.Table: Parsed data; shared between callers, which is safe
+        because Arrow tables are immutable
+    """
+    path = os.path.abspath(file_path)
+    read = _read_table if cache else _read_table.__wrapped__
+    return read(
+        path,
+        os.path.getmtime(path),
+        tuple((dtypes or {}).items()),
+        newlines_in_values,
+        timestamp_format
+    )
+
+
+def read_csv(file_path, dtypes=None, newlines_in_values=False, timestamp_format=TIMESTAMP_FORMAT):
+    """
+    Read a CSV file into a pandas DataFrame using PyArrow
+    
+    Args:
+        file_path: Path to the CSV file
+        dtypes: Optional {column: dtype name} schema; only these columns are read
+        newlines_in_values: Set to True if quoted values can contain line breaks
+        timestamp_format: strptime format used for 'timestamp' columns
+    
+    Returns:
+        DataFrame: Parsed data with timestamp columns already converted
+    """
+    # Every caller gets its own DataFrame from the shared cached table
+    return read_table(file_path, dtypes, newlines_in_values, timestamp_format).to_pandas()
+
+
+def iter_batches(file_path, dtypes=None, block_size=16 << 20, newlines_in_values=False,
+                 timestamp_format=TIMESTAMP_FORMAT, float_ints=False):
+    """
+    Stream a CSV file as Arrow record batches, for consumers that never
+    need pandas (e.g. COPY straight from the columnar buffers)
+    
+    Args:
+        file_path: Path to the CSV file
+        dtypes: Optional {column: dtype name} schema; only these columns are read
+        block_size: Bytes of CSV parsed per batch (bounds peak memory)
+        newlines_in_values: Set to True if quoted values can contain line breaks
+        timestamp_format: strptime format used for 'timestamp' columns
+        float_ints: Integer columns may be written as floats ('200.0', as
+            pandas does for integer columns with blanks), which Arrow's
+            integer parser rejects: read them as float64 and cast back
+    
+    Yields:
+        pyarrow.RecordBatch: One batch per parsed block
+    """
+    dtypes = dtypes or {}
+    read_types = dtypes
+    if float_ints:
+        read_types = {col: 'float64' if dtype.lower().startswith('int') else dtype
+                      for col, dtype in dtypes.items()}
+    
+    reader = pacsv.open_csv(
+        file_path,
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=block_size),
+        parse_options=pacsv.ParseOptions(newlines_in_values=newlines_in_values),
+        convert_options=_convert_options(read_types, timestamp_format)
+    )
+    try:
+        if read_types == dtypes:
+            yield from reader
+            return
+        for batch in reader:
+            # Safe cast: a value with a fractional part raises instead of truncating
+            yield pa.RecordBatch.from_arrays(
+                [column.cast(ARROW_TYPES[dtypes[name]]) for name, column in zip(batch.schema.names, batch.columns)],
+                names=batch.schema.names
+            )
+    finally:
+        reader.close()
+
+
+def iter_csv(file_path, dtypes=None, block_size=16 << 20, newlines_in_values=False,
+             timestamp_format=TIMESTAMP_FORMAT):
+    """
+    Stream a CSV file as pandas DataFrame chunks using PyArrow's streaming reader
+    
+    Args:
+        file_path: Path to the CSV file
+        dtypes: Optional {column: dtype name} schema; only these columns are read
+        block_size: Bytes of CSV parsed per chunk (bounds peak memory)
+        newlines_in_values: Set to True if quoted values can contain line breaks
+        timestamp_format: strptime format used for 'timestamp' columns
+    
+    Yields:
+        DataFrame: One chunk per parsed record batch
+    """
+    for batch in iter_batches(file_path, dtypes, block_size, newlines_in_values, timestamp_format):
+        yield batch.to_pandas()
@@ -3,12 +3,24 @@ Database connection utility for PostgreSQL
 Handles connection pooling and transaction management
 """
 
+import csv
 import psycopg2
 from psycopg2 import pool
-from sqlalchemy import create_engine
-import yaml
+from psycopg2.extras import execute_values
 import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+# SQLAlchemy, NumPy and PyArrow are imported in the methods that use them:
+# schema creation and the reports only need psycopg2, and skip ~0.3s of imports
+
+from src.utils.config import load_config
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -21,25 +33,28 @@ class DatabaseConnector:
     def __init__(self, config_path='config/database.yaml'):
         """Initialize database connector with configuration"""
         # Load database configuration
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
+        config = load_config(config_path)
         
         self.db_config = config['database']
+        self.pool_config = config.get('connection', {})
         self.connection_pool = None
         self.engine = None
+        self._engine_lock = threading.Lock()
         
         # Create connection pool
         self._create_pool()
-        
-        # Create SQLAlchemy engine (for pandas to_sql)
-        self._create_engine()
     
     def _create_pool(self):
         """Create PostgreSQL connection pool"""
         try:
-            self.connection_pool = psycopg2.pool.SimpleConnectionPool(
+            # Thread-safe pool: report sections and exports query it concurrently.
+            # Sized from the connection settings (pool_size + max_overflow):
+            # getconn() raises instead of waiting once every connection is in
+            # use, so the ceiling must cover parallel COPY streams plus the
+            # loader's own connection
+            self.connection_pool = psycopg2.pool.ThreadedConnectionPool(
                 minconn=1,
-                maxconn=10,
+                maxconn=self.pool_config.get('pool_size', 5) + self.pool_config.get('max_overflow', 10),
                 host=self.db_config['host'],
                 port=self.db_config['port'],
                 database=self.db_config['database'],
@@ -53,6 +68,8 @@ class DatabaseConnector:
     
     def _create_engine(self):
         """Create SQLAlchemy engine for pandas integration"""
+        from sqlalchemy import create_engine
+        
         connection_string = (
             f"postgresql://{self.db_config['user']}:"
             f"{self.db_config['password']}@"
@@ -77,8 +94,47 @@ class DatabaseConnector:
         finally:
             self.connection_pool.putconn(conn)
     
+    @contextmanager
+    def get_autocommit_connection(self):
+        """
+        Context manager for a pooled connection in autocommit mode, for
+        statements that cannot run inside a transaction block
+        (CREATE INDEX CONCURRENTLY, VACUUM)
+        """
+        conn = self.connection_pool.getconn()
+        conn.autocommit = True
+        try:
+            yield conn
+        finally:
+            conn.autocommit = False
+            self.connection_pool.putconn(conn)
+    
+    @contextmanager
+    def ddl_session(self):
+        """
+        Context manager yielding a cursor on one autocommit connection, held
+        for a whole sequence of DDL/catalog statements (schema creation)
+        
+        Each execute() commits on its own; a multi-statement string is still
+        atomic, as Postgres runs it as a single implicit transaction
+        """
+        with self.get_autocommit_connection() as conn:
+            with conn.cursor() as cur:
+                yield cur
+    
     def get_engine(self):
-        """Return SQLAlchemy engine (for pandas)"""
+        """
+        Return the SQLAlchemy engine (for pandas), created on first use
+        
+        Only phases that go through pandas need it (COPY loads, schema DDL and
+        reports use the psycopg2 pool), so the others never import the
+        dialect or open a second pool; later calls return the same engine
+        """
+        if self.engine is None:
+            # Loaders call this from worker threads: build exactly one engine
+            with self._engine_lock:
+                if self.engine is None:
+                    self._create_engine()
         return self.engine
     
     def execute_query(self, query, params=None):
@@ -96,11 +152,215 @@ class DatabaseConnector:
                 results = cur.fetchall()
                 return results
     
+    def estimate_row_counts(self, tables):
+        """
+        Row counts of several tables in one round trip, from planner
+        statistics instead of a COUNT(*) heap scan per table
+        
+        Runs ANALYZE first, so reltuples is current right after a bulk load
+        (and the planner gets fresh statistics for the loaded tables)
+        
+        Args:
+            tables: Table names
+        
+        Returns:
+            dict: {table: estimated rows} (exact for tables ANALYZE reads
+            in full, i.e. up to ~30,000 rows at the default statistics target)
+        """
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"ANALYZE {', '.join(tables)};")
+                cur.execute(
+                    """
+                    SELECT relname, GREATEST(reltuples, 0)::bigint
+                    FROM pg_class
+                    WHERE relname = ANY(%s::text[]) AND relkind = 'r';
+                    """,
+                    (list(tables),)
+                )
+                return dict(cur.fetchall())
+    
+    def insert_values(self, df, table, page_size=1000):
+        """
+        Insert a small DataFrame with multi-row INSERT ... VALUES statements
+        (psycopg2 execute_values), for tables where a COPY stream is not
+        worth it; cheaper than to_sql(method='multi'), which goes through
+        SQLAlchemy's per-row parameter handling
+        
+        Args:
+            df: DataFrame to insert (column names match the table)
+            table: Target table (must exist)
+            page_size: Rows per INSERT statement
+        
+        Returns:
+            int: Rows inserted
+        """
+        # Object columns box NumPy scalars as Python values psycopg2 can
+        # adapt, and missing values become None (NULL)
+        values = df.astype(object).where(df.notna(), None)
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                execute_values(
+                    cur,
+                    f"INSERT INTO {table} ({', '.join(df.columns)}) VALUES %s",
+                    values.itertuples(index=False, name=None),
+                    page_size=page_size
+                )
+        return len(df)
+    
+    def copy_batches_parallel(self, batches, table, max_workers=8, queue_size=2):
+        """
+        Bulk load a stream of Arrow record batches (e.g. csv_reader.iter_batches)
+        with several COPY streams at once; batches are handed to the streams as
+        they are parsed, so at most a few batches are held in memory instead
+        of the whole file
+        
+        Each stream commits on its own: if one fails the others may already
+        be loaded, so callers should empty the table before retrying
+        
+        Args:
+            batches: Iterable of RecordBatches/Tables whose column names match the table
+            table: Target table (must exist)
+            max_workers: Maximum number of COPY streams (pool allows 15 connections by default)
+            queue_size: Parsed batches waiting per stream (bounds peak memory)
+        
+        Returns:
+            int: Rows loaded
+        """
+        workers = max(1, min(max_workers, os.cpu_count() or 1))
+        pending = queue.Queue(maxsize=workers * queue_size)
+        
+        def stream():
+            try:
+                # No read-ahead: after a failure it could swallow the end marker
+                # the drain below waits for, and the parallel streams already
+                # overlap reading with COPY
+                return self.copy_from_arrow(iter(pending.get, None), table, prefetch=False)
+            except Exception:
+                # Keep draining so the reader never blocks on a full queue
+                for _ in iter(pending.get, None):
+                    pass
+                raise
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(stream) for _ in range(workers)]
+            try:
+                for batch in batches:
+                    pending.put(batch)
+            finally:
+                # One end marker per stream, also when reading fails
+                for _ in range(workers):
+                    pending.put(None)
+            return sum(future.result() for future in futures)
+    
+    def copy_from_arrow(self, batches, table, freeze=False, prefetch=True):
+        """
+        Bulk load Arrow record batches (e.g. csv_reader.iter_batches) with one
+        COPY per batch in a single transaction; Arrow's C++ CSV writer
+        serializes the columnar buffers, so no Python objects are built per cell
+        
+        Args:
+            batches: Iterable of RecordBatches/Tables whose column names match the table
+            table: Target table (must exist)
+            freeze: Empty the table and COPY ... FREEZE in the same transaction
+                (rows are written already frozen, so no later VACUUM FREEZE
+                rewrite); replaces the table's contents
+            prefetch: Read and serialize the next batch on a helper thread
+                while the current one is sent, so file I/O and parsing
+                overlap with the COPY round trip
+        
+        Returns:
+            int: Rows loaded
+        """
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+        
+        write_options = pacsv.WriteOptions(include_header=False)
+        iterator = iter(batches)
+        
+        def prepare():
+            """Next batch as (column names, row count, CSV buffer), None at the end"""
+            batch = next(iterator, None)
+            if batch is None:
+                return None
+            # Nulls are written as unquoted empty fields (COPY's CSV NULL),
+            # strings are always quoted so '' stays an empty string
+            sink = pa.BufferOutputStream()
+            pacsv.write_csv(batch, sink, write_options=write_options)
+            return batch.schema.names, batch.num_rows, sink.getvalue()
+        
+        rows = 0
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                options = self._freeze_option(cur, table, freeze)
+                prepared = self._read_ahead(prepare) if prefetch else iter(prepare, None)
+                for names, n_rows, buffer in prepared:
+                    cur.copy_expert(
+                        f"COPY {table} ({', '.join(names)}) FROM STDIN WITH (FORMAT CSV{options})",
+                        pa.BufferReader(buffer)
+                    )
+                    rows += n_rows
+        return rows
+    
+    @staticmethod
+    def _read_ahead(produce):
+        """
+        Yield produce() results until it returns None, computing the next one
+        on a helper thread while the caller works on the current one (Arrow's
+        parser and CSV writer and psycopg2's COPY all release the GIL)
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            upcoming = executor.submit(produce)
+            while (item := upcoming.result()) is not None:
+                upcoming = executor.submit(produce)
+                yield item
+    
+    def copy_from_csv(self, file_path, table, freeze=False):
+        """
+        Bulk load a CSV file whose header matches the table's column names,
+        streaming the file itself into COPY (no DataFrame in between)
+        
+        Args:
+            file_path: CSV file with a header row (empty field = NULL)
+            table: Target table (must exist)
+            freeze: Empty the table and COPY ... FREEZE in the same transaction
+                (rows are written already frozen, so no later VACUUM FREEZE
+                rewrite); replaces the table's contents
+        
+        Returns:
+            int: Rows loaded
+        """
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            header = next(csv.reader(f))
+            f.seek(0)
+            with self.get_connection() as conn:
+                with conn.cursor() as cur:
+                    options = self._freeze_option(cur, table, freeze)
+                    cur.copy_expert(
+                        f"COPY {table} ({', '.join(header)}) FROM STDIN WITH (FORMAT CSV, HEADER{options})",
+                        f
+                    )
+                    return cur.rowcount
+    
+    @staticmethod
+    def _freeze_option(cur, table, freeze):
+        """
+        Extra COPY option for freeze loads: FREEZE is only allowed when the
+        table was created or truncated in the current transaction
+        """
+        if not freeze:
+            return ""
+        cur.execute(f"TRUNCATE {table};")
+        return ", FREEZE"
+    
     def close_pool(self):
         """Close all connections in pool"""
         if self.connection_pool:
             self.connection_pool.closeall()
             logger.info("✓ Connection pool closed")
+        if self.engine is not None:
+            self.engine.dispose()
+            self.engine = None
 
 
 # Test the connection
@@ -1,12 +1,175 @@
 """
 Logging utility for ETL pipeline
-Logs to both console and file
+Logs to both console and file (written by a background listener thread)
 Windows-compatible version (no Unicode symbols)
 """
 
+import atexit
+import copy
 import logging
+import logging.handlers
 import os
+import queue
+import threading
 from datetime import datetime
+from functools import lru_cache
+
+# One queue per log file; its QueueListener thread owns the file and console
+# handlers, so logging calls only enqueue the record and never block on I/O
+_log_queues = {}
+_log_queues_lock = threading.Lock()
+
+# Loggers returned by setup_logger, by name
+_loggers = {}
+
+# Level above CRITICAL: a logger muted with LOG_<NAME>=0 drops every call
+# before a record is created
+_MUTED = logging.CRITICAL + 1
+
+# The log file is written through a 64 KB buffer, flushed once the queue has
+# been idle for LOG_FLUSH_INTERVAL seconds (and right away for warnings)
+LOG_BUFFER_SIZE = 64 << 10
+LOG_FLUSH_INTERVAL = 1.0
+
+# Level of every pipeline logger, from the LOG_LEVEL environment variable
+# (e.g. LOG_LEVEL=WARNING keeps only warnings and errors on long runs)
+LOG_LEVEL = getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+
+
+class _BufferedFileHandler(logging.FileHandler):
+    """
+    FileHandler that batches records into few write() calls: encoded lines
+    go straight into a binary LOG_BUFFER_SIZE buffer (no TextIOWrapper
+    layer), which is only flushed for WARNING and above, or by the listener;
+    the file is opened in append mode, so every flush is an O_APPEND write
+    """
+    
+    def _open(self):
+        return open(self.baseFilename, 'ab', buffering=LOG_BUFFER_SIZE)
+    
+    def emit(self, record):
+        # StreamHandler.emit without its flush after every record
+        if self.stream is None:
+            self.stream = self._open()
+        try:
+            line = self.format(record) + self.terminator
+            self.stream.write(line.encode(self.encoding or 'utf-8', self.errors or 'strict'))
+        except Exception:
+            self.handleError(record)
+            return
+        if record.levelno >= logging.WARNING:
+            self.flush()
+
+
+class _FileFormatter(logging.Formatter):
+    """
+    Formatter for the log file layout 'time | name | level | message'
+    
+    The line is built with one f-string instead of Formatter.format's
+    %-style pass over the record, and the timestamp is rendered once per
+    second instead of once per record (datefmt has no sub-second fields, so
+    records in the same second share it); only the listener thread formats,
+    so no locking is needed
+    """
+    
+    def __init__(self, datefmt=None):
+        super().__init__(datefmt=datefmt)
+        self._cached_second = None
+        self._cached_time = None
+    
+    def format(self, record):
+        line = f"{self.formatTime(record, self.datefmt)} | {record.name} | {record.levelname} | {record.getMessage()}"
+        # Tracebacks travel through the queue unformatted, see _LocalQueueHandler
+        if record.exc_info:
+            line = f"{line}\n{self.formatException(record.exc_info)}"
+        return line
+    
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        if second != self._cached_second:
+            self._cached_time = super().formatTime(record, datefmt)
+            self._cached_second = second
+        return self._cached_time
+
+
+class _LocalQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler for a listener in the same process: the record is never
+    pickled, so it is not pre-formatted here (QueueHandler.prepare runs a
+    full format() on the logging thread only for the listener to format it
+    again). Only the message arguments are bound now, so later changes to
+    them do not show up in the log.
+    """
+    
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _FlushingQueueListener(logging.handlers.QueueListener):
+    """QueueListener that flushes its handlers whenever the queue goes idle"""
+    
+    def dequeue(self, block):
+        try:
+            return self.queue.get(block, timeout=LOG_FLUSH_INTERVAL)
+        except queue.Empty:
+            for handler in self.handlers:
+                handler.flush()
+            return self.queue.get(block)
+
+
+def _log_queue(log_filename):
+    """
+    Queue feeding the file and console handlers of a log file, created (and
+    its listener thread started) on first use; None is console only
+    """
+    with _log_queues_lock:
+        log_queue = _log_queues.get(log_filename)
+        if log_queue is not None:
+            return log_queue
+        
+        # Create formatters
+        file_formatter = _FileFormatter(datefmt='%Y-%m-%d %H:%M:%S')
+        console_formatter = logging.Formatter(
+            '%(levelname)s: %(message)s'
+        )
+        
+        # Console handler - use UTF-8 if possible, fallback to system encoding
+        # (stderr, flushed per record: only the file handler is batched)
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(LOG_LEVEL)
+        console_handler.setFormatter(console_formatter)
+        handlers = [console_handler]
+        
+        # File handler (daily log file) - UTF-8 encoding
+        if log_filename is not None:
+            file_handler = _BufferedFileHandler(log_filename, encoding='utf-8')
+            file_handler.setLevel(LOG_LEVEL)
+            file_handler.setFormatter(file_formatter)
+            handlers.insert(0, file_handler)
+        
+        log_queue = queue.SimpleQueue()
+        listener = _FlushingQueueListener(
+            log_queue, *handlers, respect_handler_level=True
+        )
+        listener.start()
+        # Drain the queue on exit (runs before logging's own shutdown flush)
+        atexit.register(listener.stop)
+        
+        _log_queues[log_filename] = log_queue
+        return log_queue
+
+
+@lru_cache(maxsize=None)
+def log_path(log_dir='logs'):
+    """
+    Daily log file of a log directory (created if missing), resolved once
+    per process: a run that passes midnight keeps its start date's file
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    return f"{log_dir}/etl_{datetime.now().strftime('%Y%m%d')}.log"
 
 
 def setup_logger(name, log_dir='logs'):
@@ -15,45 +178,32 @@ def setup_logger(name, log_dir='logs'):
     
     Args:
         name: Logger name (usually module name)
-        log_dir: Directory for log files
+        log_dir: Directory for log files, None to log to the console only
+    
+    Setting LOG_<NAME>=0 in the environment (name upper-cased, dots as
+    underscores, e.g. LOG_EXTRACT_BASE=0) mutes that logger entirely
     
     Returns:
         logger: Configured logger instance
     """
-    # Create logs directory if it doesn't exist
-    os.makedirs(log_dir, exist_ok=True)
+    # Loggers already set up by this function are returned straight away
+    logger = _loggers.get(name)
+    if logger is not None:
+        return logger
     
     # Create logger
     logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
+    muted = os.getenv(f"LOG_{name.upper().replace('.', '_')}") == '0'
+    logger.setLevel(_MUTED if muted else LOG_LEVEL)
+    _loggers[name] = logger
     
     # Avoid duplicate handlers
     if logger.handlers:
         return logger
     
-    # Create formatters
-    file_formatter = logging.Formatter(
-        '%(asctime)s | %(name)s | %(levelname)s | %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    console_formatter = logging.Formatter(
-        '%(levelname)s: %(message)s'
-    )
-    
-    # File handler (daily log file) - UTF-8 encoding
-    log_filename = f"{log_dir}/etl_{datetime.now().strftime('%Y%m%d')}.log"
-    file_handler = logging.FileHandler(log_filename, encoding='utf-8')
-    file_handler.setLevel(logging.INFO)
-    file_handler.setFormatter(file_formatter)
-    
-    # Console handler - use UTF-8 if possible, fallback to system encoding
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(console_formatter)
-    
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # Records go through a queue to the shared file/console handlers
+    log_filename = log_path(log_dir) if log_dir is not None else None
+    logger.addHandler(_LocalQueueHandler(_log_queue(log_filename)))
     
     return logger
 
@@ -64,4 +214,4 @@ if __name__ == "__main__":
     logger.info("This is an info message")
     logger.warning("This is a warning message")
     logger.error("This is an error message")
-    print(f"Log file created in: logs/etl_{datetime.now().strftime('%Y%m%d')}.log")
+    print(f"Log file created in: {log_path()}")
@@ -0,0 +1,69 @@
+"""
+Parquet snapshots of DataFrames, tagged with the key of the inputs they
+were built from; shared by the extract cache and the dimension cache
+"""
+
+import hashlib
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.utils.logger import setup_logger
+
+logger = setup_logger('parquet_cache')
+
+# Parquet schema metadata key holding the snapshot's cache key
+CACHE_KEY_FIELD = b'etl_cache_key'
+
+
+def file_signature(path):
+    """(mtime, size) of a file: changes whenever the file is rewritten"""
+    return os.path.getmtime(path), os.path.getsize(path)
+
+
+def make_key(*parts):
+    """Cache key (bytes) from any repr()-able parts"""
+    return hashlib.md5(repr(parts).encode()).hexdigest().encode()
+
+
+def is_valid(path, cache_key):
+    """Check the snapshot exists and was written for this cache key"""
+    if not os.path.exists(path):
+        return False
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+    except Exception as e:
+        logger.warning(f"⚠ Unreadable cache {path}, rebuilding: {e}")
+        return False
+    return metadata.get(CACHE_KEY_FIELD) == cache_key
+
+
+def read(path, columns=None):
+    """Read a snapshot back as a DataFrame (dtypes and categories are kept)"""
+    return pq.read_table(path, columns=columns).to_pandas()
+
+
+def write(df, path, cache_key):
+    """
+    Write a snapshot tagged with cache_key; a failed write only costs the
+    next run a rebuild
+    
+    Returns:
+        bool: True if the snapshot was written
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            CACHE_KEY_FIELD: cache_key
+        })
+        # Write to a temp file and rename, so readers never see a partial snapshot
+        tmp_path = f"{path}.tmp"
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        logger.warning(f"⚠ Could not write cache {path}: {e}")
+        return False
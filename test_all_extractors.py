@@ -3,6 +3,7 @@ Test all extractors to ensure they work correctly
 """
 
 import sys
+from concurrent.futures import ThreadPoolExecutor
 sys.path.append('.')
 
 from src.extract.extract_orders import OrdersExtractor
@@ -12,61 +13,41 @@ from src.extract.extract_products import ProductsExtractor
 from src.extract.extract_payments import PaymentsExtractor
 from src.extract.extract_reviews import ReviewsExtractor
 
+# Label -> extractor; the extractors are independent, so they run concurrently
+EXTRACTORS = {
+    'Orders': OrdersExtractor,
+    'Order Items': OrderItemsExtractor,
+    'Customers': CustomersExtractor,
+    'Products': ProductsExtractor,
+    'Payments': PaymentsExtractor,
+    'Reviews': ReviewsExtractor
+}
+
 print("="*80)
 print("TESTING ALL EXTRACTORS")
 print("="*80)
 
 try:
-    # Test 1: Orders
-    print("\n[1/6] Testing Orders Extractor...")
-    orders_ext = OrdersExtractor()
-    df_orders = orders_ext.extract()
-    print(f"✓ Orders: {len(df_orders):,} rows extracted\n")
-    
-    # Test 2: Order Items
-    print("[2/6] Testing Order Items Extractor...")
-    items_ext = OrderItemsExtractor()
-    df_items = items_ext.extract()
-    print(f"✓ Order Items: {len(df_items):,} rows extracted\n")
-    
-    # Test 3: Customers
-    print("[3/6] Testing Customers Extractor...")
-    customers_ext = CustomersExtractor()
-    df_customers = customers_ext.extract()
-    print(f"✓ Customers: {len(df_customers):,} rows extracted\n")
-    
-    # Test 4: Products
-    print("[4/6] Testing Products Extractor...")
-    products_ext = ProductsExtractor()
-    df_products = products_ext.extract()
-    print(f"✓ Products: {len(df_products):,} rows extracted\n")
-    
-    # Test 5: Payments
-    print("[5/6] Testing Payments Extractor...")
-    payments_ext = PaymentsExtractor()
-    df_payments = payments_ext.extract()
-    print(f"✓ Payments: {len(df_payments):,} rows extracted\n")
-    
-    # Test 6: Reviews
-    print("[6/6] Testing Reviews Extractor...")
-    reviews_ext = ReviewsExtractor()
-    df_reviews = reviews_ext.extract()
-    print(f"✓ Reviews: {len(df_reviews):,} rows extracted\n")
-    
-    print("="*80)
+    with ThreadPoolExecutor(max_workers=len(EXTRACTORS)) as executor:
+        futures = {name: executor.submit(cls().extract) for name, cls in EXTRACTORS.items()}
+        
+        # Report in the usual order; result() re-raises a failed extraction
+        row_counts = {}
+        for i, (name, future) in enumerate(futures.items(), start=1):
+            print(f"\n[{i}/{len(futures)}] Testing {name} Extractor...")
+            row_counts[name] = len(future.result())
+            print(f"✓ {name}: {row_counts[name]:,} rows extracted")
+    
+    print("\n" + "="*80)
     print("✓ ALL EXTRACTORS PASSED!")
     print("="*80)
     
     # Summary
     print("\nEXTRACTION SUMMARY:")
-    print(f"  Orders:       {len(df_orders):>8,} rows")
-    print(f"  Order Items:  {len(df_items):>8,} rows")
-    print(f"  Customers:    {len(df_customers):>8,} rows")
-    print(f"  Products:     {len(df_products):>8,} rows")
-    print(f"  Payments:     {len(df_payments):>8,} rows")
-    print(f"  Reviews:      {len(df_reviews):>8,} rows")
+    for name, rows in row_counts.items():
+        print(f"  {name + ':':<14}{rows:>8,} rows")
     print(f"  {'─'*30}")
-    print(f"  Total:        {len(df_orders)+len(df_items)+len(df_customers)+len(df_products)+len(df_payments)+len(df_reviews):>8,} rows")
+    print(f"  Total:        {sum(row_counts.values()):>8,} rows")
     
 except Exception as e:
     print(f"\n✗ EXTRACTOR TEST FAILED: {e}")
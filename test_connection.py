@@ -1,42 +1,68 @@
 import psycopg2
+import psycopg2.pool
 from dotenv import load_dotenv
 import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Load environment variables
 load_dotenv()
 
-# Connection parameters
-conn_params = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'port': os.getenv('DB_PORT', '5432'),
-    'database': os.getenv('DB_NAME', 'olist_dw'),
-    'user': os.getenv('DB_USER', 'postgres'),
-    'password': os.getenv('DB_PASSWORD', '000925Lilas')
-}
+# Connection parameters; the password has no default, so a missing .env
+# fails here instead of connecting with a stale credential
+try:
+    conn_params = {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'port': os.getenv('DB_PORT', '5432'),
+        'database': os.getenv('DB_NAME', 'olist_dw'),
+        'user': os.getenv('DB_USER', 'postgres'),
+        'password': os.environ['DB_PASSWORD']
+    }
+except KeyError as e:
+    raise SystemExit(f"❌ {e.args[0]} not set: set it in .env")
+
+# Concurrent connections to open: the load step runs parallel COPY streams,
+# so check the server accepts more than one session at a time
+N_CONNECTIONS = 8
+
+
+def check_connection(pool):
+    """Open one pooled connection and run SELECT 1, returns seconds taken"""
+    t0 = time.perf_counter()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1;")
+            cursor.fetchone()
+    finally:
+        pool.putconn(conn)
+    return time.perf_counter() - t0
 
+
+pool = None
 try:
     # Attempt connection
-    print("Attempting to connect to PostgreSQL...")
-    conn = psycopg2.connect(**conn_params)
-    
-    # Create cursor
-    cursor = conn.cursor()
+    print(f"Attempting {N_CONNECTIONS} concurrent connections to PostgreSQL...")
+    pool = psycopg2.pool.ThreadedConnectionPool(1, N_CONNECTIONS, **conn_params)
     
-    # Test query
-    cursor.execute("SELECT version();")
-    db_version = cursor.fetchone()
+    # Server info from the pool's first connection
+    conn = pool.getconn()
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT version(), current_database();")
+        db_version, current_db = cursor.fetchone()
+    pool.putconn(conn)
     print(f"✅ Connection successful!")
-    print(f"PostgreSQL version: {db_version[0]}")
-    
-    # Check database
-    cursor.execute("SELECT current_database();")
-    current_db = cursor.fetchone()[0]
+    print(f"PostgreSQL version: {db_version}")
     print(f"Connected to database: {current_db}")
     
-    # Close connection
-    cursor.close()
-    conn.close()
-    print("Connection closed successfully.")
+    # Run N checks at once; a check that makes the pool open a new
+    # connection includes its handshake in the latency
+    with ThreadPoolExecutor(max_workers=N_CONNECTIONS) as executor:
+        latencies = sorted(executor.map(lambda _: check_connection(pool), range(N_CONNECTIONS)))
+    print(f"✅ {N_CONNECTIONS} concurrent connections OK")
+    print(f"Connection latency (ms): min {latencies[0]*1000:.1f} | "
+          f"median {statistics.median(latencies)*1000:.1f} | max {latencies[-1]*1000:.1f}")
     
 except psycopg2.Error as e:
     print(f"❌ Connection failed!")
@@ -49,3 +75,9 @@ except psycopg2.Error as e:
 
 except Exception as e:
     print(f"❌ Unexpected error: {e}")
+
+finally:
+    # Close connections
+    if pool is not None:
+        pool.closeall()
+        print("Connections closed successfully.")